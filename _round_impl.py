@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Line loops of build_round_files._full_from_lines (section scan, frame and block collection).
+
+Pure list/str work on already-normalized lines; the regex/str predicates are passed in,
+so the module is fully annotated and can be AOT-compiled with mypyc:
+
+    mypyc _round_impl.py
+
+The compiled extension is picked up by the normal import (extension modules win over
+the .py of the same name); without it this file runs as plain Python.
+"""
+
+from typing import Callable, Dict, List, Tuple
+
+Pred = Callable[[str], object]
+
+
+def first_section_indices(lines: List[str], tests: List[Tuple[str, Pred]]) -> Dict[str, int]:
+    """One pass: key -> index of the first line matching that key's test."""
+    first_idx: Dict[str, int] = {}
+    pending = list(tests)
+    for i, s in enumerate(lines):
+        if not s:
+            continue
+        hit = False
+        for key, test in pending:
+            if test(s):
+                first_idx[key] = i
+                hit = True
+        if hit:
+            pending = [p for p in pending if p[0] not in first_idx]
+            if not pending:
+                break
+    return first_idx
+
+
+def call_trace_frames(lines: List[str], ct_idx: int, max_frames: int, skip: Pred) -> List[str]:
+    """Frames after the "Call Trace:" line: stop at a blank line, skip utility frames."""
+    frames: List[str] = []
+    for j in range(ct_idx + 1, min(ct_idx + 1 + max_frames * 2, len(lines))):
+        cand = lines[j].strip()
+        if not cand:
+            break
+        if skip(cand):
+            continue
+        frames.append(lines[j])
+        if len(frames) >= max_frames:
+            break
+    return frames
+
+
+def collect_block(lines: List[str], start_idx: int, stop_pred: Pred, max_next: int = 64) -> List[str]:
+    """Header line plus following non-blank lines, up to stop_pred or max_next lines."""
+    out = [lines[start_idx]]
+    for j in range(start_idx + 1, min(len(lines), start_idx + 1 + max_next)):
+        s = lines[j]
+        if not s.strip():
+            break
+        if stop_pred(s):
+            break
+        out.append(s)
+    return out
@@ -23,8 +23,23 @@ python build_round_files.py \
     python build_round_files.py --input crawler/result --out ./preprocess --source crawler
 """
 
-import os, json, glob, re, argparse, sys
-from typing import List, Dict, Any
+import os, json, re, argparse, sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+from typing import List, Dict, Any, Iterable, Iterator, Tuple
+
+# full 抽取的行循环（可 mypyc 编译，见 _round_impl.py）
+from _round_impl import collect_block as _collect_block, \
+    first_section_indices as _first_section_indices, call_trace_frames as _call_trace_frames
+
+try:
+    import orjson
+except ImportError:  # falls back to the stdlib json module
+    orjson = None
+try:
+    import ijson
+except ImportError:  # top-level lists are then loaded in one go
+    ijson = None
 
 # ---------------- Utilities ----------------
 
@@ -32,6 +47,9 @@ def ensure_dir(p: str):
     os.makedirs(p, exist_ok=True)
 
 def read_json(path: str):
+    if orjson is not None:
+        with open(path, "rb") as f:
+            return orjson.loads(f.read())
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
@@ -47,10 +65,15 @@ def read_jsonl(path: str):
                 pass
     return rows
 
-def write_jsonl(rows: List[dict], path: str):
-    with open(path, "w", encoding="utf-8") as f:
+def jsonl_line(obj: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+
+def write_jsonl(rows: Iterable[dict], path: str):
+    with open(path, "wb") as f:
         for r in rows:
-            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+            f.write(jsonl_line(r))
 
 def pick_first_nonempty(lst: List[str]) -> str:
     for x in lst or []:
@@ -64,50 +87,109 @@ TS_PREFIX = re.compile(r'^\s*\[\s*\d+(?:\.\d+)?\]\s*', re.I)
 
 BUG_RE = re.compile(r'BUG:\s*KASAN:', re.I)
 RW_RE  = re.compile(r'\b(?:Read|Write)\s+of\s+size\s+\d+', re.I)
-CT_RE  = re.compile(r'^\s*Call Trace:\s*$', re.I)
 CPU_RE = re.compile(r'^CPU:\s+.*Not tainted', re.I)
 
-RIP_RE = re.compile(r'^\s*RIP:\s', re.I)
-RSP_RE = re.compile(r'^\s*RSP:\s', re.I)
-ALLOCATED_BY = re.compile(r'^\s*Allocated by task', re.I)
-FREED_BY     = re.compile(r'^\s*Freed by task', re.I)
-MEM_AROUND   = re.compile(r'^\s*Memory state around', re.I)
-BUGGY_ADDR   = re.compile(r'^\s*The buggy address belongs to', re.I)
-
-SKIP_PREFIX = re.compile(
-    r'^(?:dump_stack|show_stack|print_address|print_report|kasan_report|__pfx_|__warn|'
-    r'warn_slowpath|__virt_addr_valid|kasan_|__asan_|_printk|printk|vprintk|report_bug)\b',
-    re.I
+# Anchored literal headers: plain str tests instead of regex dispatch.
+def is_call_trace(s: str) -> bool:
+    """Same as /^\\s*Call Trace:\\s*$/i."""
+    return s.strip().lower() == "call trace:"
+
+def _ci_prefix(prefix: str, ws_after: bool = False):
+    """Build a case-insensitive /^\\s*<prefix>/ test (optionally followed by whitespace)."""
+    low = prefix.lower(); n = len(low); first = low[0] + low[0].upper()
+    def test(s: str) -> bool:
+        t = s.lstrip()
+        if t[:1] not in first or t[:n].lower() != low:
+            return False
+        return t[n:n+1].isspace() if ws_after else True
+    return test
+
+is_rip          = _ci_prefix("RIP:", ws_after=True)
+is_rsp          = _ci_prefix("RSP:", ws_after=True)
+is_allocated_by = _ci_prefix("Allocated by task")
+is_freed_by     = _ci_prefix("Freed by task")
+is_mem_around   = _ci_prefix("Memory state around")
+is_buggy_addr   = _ci_prefix("The buggy address belongs to")
+
+# Utility frames to skip: a frame is skipped when it starts with one of these
+# names (case-insensitive) followed by a non-word character or end of line.
+SKIP_NAMES = (
+    "dump_stack", "show_stack", "print_address", "print_report", "kasan_report", "__pfx_", "__warn",
+    "warn_slowpath", "__virt_addr_valid", "kasan_", "__asan_", "_printk", "printk", "vprintk", "report_bug",
 )
+_SKIP_HEAD = max(map(len, SKIP_NAMES)) + 1
+
+def is_skip_frame(s: str) -> bool:
+    head = s[:_SKIP_HEAD].lower()
+    if not head.startswith(SKIP_NAMES):     # C-level reject: the common case for real frames
+        return False
+    for name in SKIP_NAMES:
+        if head.startswith(name):
+            nxt = head[len(name):len(name)+1]
+            if not (nxt.isalnum() or nxt == "_"):
+                return True
+    return False
+
+_TS_MATCH = TS_PREFIX.match
 
 def norm_line(s: str) -> str:
+    # match + slice instead of sub: no new string is built when there is no timestamp
     s = (s or "").rstrip("\r\n")
-    return TS_PREFIX.sub("", s)
+    m = _TS_MATCH(s)
+    return s[m.end():] if m else s
+
+# Lowercase literals that every anchor/section regex above needs to match.
+# Nothing before the first of them can match, so the per-line scans start at
+# that line -- on syzbot console logs this skips the long boot preamble.
+_ANCHOR_HINTS = ("bug:", "read", "write", "call trace:", "cpu:")
+_FULL_HINTS = _ANCHOR_HINTS + ("rip:", "rsp:", "allocated by task", "freed by task",
+                               "the buggy address belongs to", "memory state around")
+
+def _tail_from_first_hint(src_text: str, hints) -> str:
+    """src_text from the start of the line holding the earliest hint ("" if none)."""
+    low = src_text.lower()
+    if len(low) != len(src_text):   # case mapping changed offsets; scan everything
+        return src_text
+    pos = min((p for p in map(low.find, hints) if p >= 0), default=-1)
+    if pos < 0:
+        return ""
+    return src_text[src_text.rfind("\n", 0, pos) + 1:]
 
 # ---------------- Short (slice) extraction ----------------
 
 def extract_anchor_lines(src_text: str, max_lines: int = 5) -> List[str]:
-    """Extract up to 5 anchor lines: BUG -> RW -> 'Call Trace:' -> first frame -> CPU."""
+    """
+    Extract up to 5 anchor lines: BUG -> RW -> 'Call Trace:' -> first frame -> CPU.
+    Single pass: each non-blank line is normalized once and only checked against
+    the anchors still missing; stops as soon as every slot is resolved.
+    """
     if not isinstance(src_text, str) or not src_text.strip():
         return []
-    lines = [norm_line(x) for x in src_text.splitlines() if x.strip()]
-
-    bug = next((ln for ln in lines if BUG_RE.search(ln)), None)
-    rw  = next((ln for ln in lines if RW_RE.search(ln)), None)
-
-    ct_idx = next((i for i, ln in enumerate(lines) if CT_RE.search(ln)), None)
-    ct_idx = next((i for i,ln in enumerate(lines) if CT_RE.search(ln)), None)
-    ct = lines[ct_idx] if ct_idx is not None else None
-
-    first_frame = None
-    if ct_idx is not None:
-        for j in range(ct_idx+1, min(ct_idx+15, len(lines))):
-            cand = lines[j].strip()
-            if cand and not SKIP_PREFIX.search(cand):
+    raw_lines = _tail_from_first_hint(src_text, _ANCHOR_HINTS).splitlines()
+    return _anchors_from_lines((norm_line(x) for x in raw_lines if x.strip()), max_lines)
+
+def _anchors_from_lines(lines: Iterable[str], max_lines: int = 5) -> List[str]:
+    """Anchor slots from the normalized non-blank lines; `lines` is consumed lazily."""
+    bug_s, rw_s, ct_s, cpu_s, skip_s = BUG_RE.search, RW_RE.search, is_call_trace, CPU_RE.search, is_skip_frame
+    bug = rw = ct = first_frame = cpu = None
+    frame_window = 0   # non-blank lines left to search for the first frame after 'Call Trace:'
+    for ln in lines:
+        if frame_window:
+            frame_window -= 1
+            cand = ln.strip()
+            if cand and not skip_s(cand):
                 first_frame = cand
-                break
+                frame_window = 0
 
-    cpu = next((ln for ln in lines if CPU_RE.search(ln)), None)
+        if bug is None and bug_s(ln): bug = ln
+        if rw is None and rw_s(ln): rw = ln
+        if ct is None and ct_s(ln):
+            ct = ln
+            frame_window = 14
+        if cpu is None and cpu_s(ln): cpu = ln
+
+        if bug is not None and rw is not None and cpu is not None and ct is not None and not frame_window:
+            break
 
     out = []
     if bug: out.append(bug)
@@ -119,15 +201,6 @@ def extract_anchor_lines(src_text: str, max_lines: int = 5) -> List[str]:
 
 # ---------------- Full extraction (multi-sections) ----------------
 
-def _collect_block(lines: List[str], start_idx: int, stop_pred, max_next=64) -> List[str]:
-    out = [lines[start_idx]]
-    for j in range(start_idx+1, min(len(lines), start_idx+1+max_next)):
-        s = lines[j]
-        if not s.strip(): break
-        if stop_pred(s): break
-        out.append(s)
-    return out
-
 def extract_full_from_text(src_text: str, max_frames: int = 32) -> List[str]:
     """
     Try to reconstruct a syzbot-like long report from raw text.
@@ -142,97 +215,125 @@ def extract_full_from_text(src_text: str, max_frames: int = 32) -> List[str]:
     """
     if not isinstance(src_text, str) or not src_text.strip():
         return []
-    raw_lines = src_text.splitlines()
-    lines = [norm_line(x) for x in raw_lines]
+    _, lines = split_normalized(src_text)
+    out = _full_from_lines(lines, max_frames)
+    if not out:
+        out = extract_anchor_lines(src_text)
+    return out
+
+def split_normalized(src_text: str) -> Tuple[List[str], List[str]]:
+    """
+    (raw_lines, normalized_lines) of src_text from its first section hint on.
+    Covers both extractors, so one bug's log only needs to be split and normalized once.
+    """
+    raw_lines = _tail_from_first_hint(src_text, _FULL_HINTS).splitlines()
+    return raw_lines, [norm_line(x) for x in raw_lines]
+
+def _full_from_lines(lines: List[str], max_frames: int = 32) -> List[str]:
+    """
+    Section assembly of extract_full_from_text on already-normalized lines.
+    The per-line loops live in _first_section_indices / _call_trace_frames / _collect_block
+    (compiled from _round_impl when available).
+    """
+    bug_s, rw_s, ct_s, cpu_s = BUG_RE.search, RW_RE.search, is_call_trace, CPU_RE.search
+    alloc_s, freed_s = is_allocated_by, is_freed_by
+
+    first_idx = _first_section_indices(lines, [
+        ("BUG", bug_s), ("RW", rw_s), ("RIP", is_rip), ("RSP", is_rsp), ("CPU", cpu_s),
+        ("CT", ct_s), ("ALLOC", alloc_s), ("FREED", freed_s), ("BUGGY", is_buggy_addr), ("MEM", is_mem_around),
+    ])
 
     out = []
 
     # 1) single-line key facts
-    for pat in (BUG_RE, RW_RE, RIP_RE, RSP_RE, CPU_RE):
-        m = next((ln for ln in lines if ln and pat.search(ln)), None)
-        if m and m not in out:
-            out.append(m)
+    for key in ("BUG", "RW", "RIP", "RSP", "CPU"):
+        i = first_idx.get(key)
+        if i is not None and lines[i] not in out:
+            out.append(lines[i])
 
     # 2) call trace + frames
-    ct_idx = next((i for i,s in enumerate(lines) if s and CT_RE.search(s)), None)
+    ct_idx = first_idx.get("CT")
     if ct_idx is not None:
         out.append(lines[ct_idx])
-        frames = []
-        for j in range(ct_idx+1, min(ct_idx+1+max_frames*2, len(lines))):
-            cand = lines[j].strip()
-            if not cand: break
-            if SKIP_PREFIX.search(cand): continue
-            frames.append(lines[j])
-            if len(frames) >= max_frames: break
-        out.extend(frames)
+        out.extend(_call_trace_frames(lines, ct_idx, max_frames, is_skip_frame))
 
     # 3) allocated by ...
-    idx_alloc = next((i for i,s in enumerate(lines) if s and ALLOCATED_BY.search(s)), None)
+    idx_alloc = first_idx.get("ALLOC")
     if idx_alloc is not None:
-        blk = _collect_block(lines, idx_alloc, lambda s: FREED_BY.search(s) or BUG_RE.search(s) or CT_RE.search(s))
+        blk = _collect_block(lines, idx_alloc, lambda s: freed_s(s) or bug_s(s) or ct_s(s))
         out.extend(blk)
 
     # 4) freed by ...
-    idx_freed = next((i for i,s in enumerate(lines) if s and FREED_BY.search(s)), None)
+    idx_freed = first_idx.get("FREED")
     if idx_freed is not None:
-        blk = _collect_block(lines, idx_freed, lambda s: ALLOCATED_BY.search(s) or BUG_RE.search(s) or CT_RE.search(s))
+        blk = _collect_block(lines, idx_freed, lambda s: alloc_s(s) or bug_s(s) or ct_s(s))
         out.extend(blk)
 
     # 5) buggy address ...
-    m_buggy = next((i for i,s in enumerate(lines) if s and BUGGY_ADDR.search(s)), None)
+    m_buggy = first_idx.get("BUGGY")
     if m_buggy is not None:
         out.append(lines[m_buggy])
 
     # 6) memory state around ...
-    m_mem = next((i for i,s in enumerate(lines) if s and MEM_AROUND.search(s)), None)
+    m_mem = first_idx.get("MEM")
     if m_mem is not None:
-        blk = _collect_block(lines, m_mem, lambda s: BUG_RE.search(s) or CT_RE.search(s) or CPU_RE.search(s), max_next=32)
+        blk = _collect_block(lines, m_mem, lambda s: bug_s(s) or ct_s(s) or cpu_s(s), max_next=32)
         out.extend(blk)
 
-    # dedup + drop blanks
-    out2, seen = [], set()
-    for s in out:
-        if not s or not s.strip(): continue
-        if s in seen: continue
-        out2.append(s); seen.add(s)
-
-    if not out2:
-        out2 = extract_anchor_lines(src_text)
-    return out2
+    # dedup (order-preserving) + drop blanks
+    return list(dict.fromkeys(s for s in out if s and s.strip()))
 
 # ---------------- Crawler input parsing ----------------
 
 def is_bug_obj(x: Any) -> bool:
     return isinstance(x, dict) and "title" in x and "crashes" in x
 
-def load_all_bugs_from_crawler(input_path: str) -> List[Dict]:
-    bugs = []
-    if os.path.isdir(input_path):
-        for fp in glob.glob(os.path.join(input_path, "*.json")):
-            try:
-                data = read_json(fp)
-            except Exception as e:
-                print(f"[WARN] read fail: {fp}: {e}", file=sys.stderr); continue
-            if isinstance(data, list) and data and is_bug_obj(data[0]):
-                bugs.extend(data)
-            elif isinstance(data, list) and data and all(isinstance(x, dict) for x in data):
-                bugs.extend([x for x in data if is_bug_obj(x)])
-            elif isinstance(data, dict) and is_bug_obj(data):
-                bugs.append(data)
-    else:
-        data = read_json(input_path)
-        if isinstance(data, list):
-            bugs.extend([x for x in data if is_bug_obj(x)])
-        elif isinstance(data, dict) and is_bug_obj(data):
-            bugs.append(data)
-
-    # dedup by extid/url
-    seen, uniq = set(), []
-    for b in bugs:
-        key = b.get("extid") or b.get("url") or id(b)
-        if key in seen: continue
-        uniq.append(b); seen.add(key)
-    return uniq
+def iter_json_bugs(path: str) -> Iterator[Dict]:
+    """
+    Yield bug objects from one crawler JSON file (a single bug or a list of them).
+    With ijson installed, top-level lists (e.g. the combined bugs.json) are
+    streamed item by item instead of being materialized.
+    """
+    if ijson is not None:
+        with open(path, "rb") as f:
+            c = f.read(1)
+            while c and c.isspace():
+                c = f.read(1)
+            if c == b"[":
+                f.seek(0)
+                for x in ijson.items(f, "item", use_float=True):
+                    if is_bug_obj(x):
+                        yield x
+                return
+    data = read_json(path)
+    if isinstance(data, list):
+        yield from (x for x in data if is_bug_obj(x))
+    elif is_bug_obj(data):
+        yield data
+
+def _iter_json_files(dir_path: str) -> Iterator[str]:
+    """Paths of the *.json files in dir_path (dotfiles skipped, like glob)."""
+    with os.scandir(dir_path) as it:
+        for ent in it:
+            if ent.name.endswith(".json") and not ent.name.startswith(".") and ent.is_file():
+                yield ent.path
+
+def load_all_bugs_from_crawler(input_path: str) -> Iterator[Dict]:
+    """Lazily yield bugs from a crawler dir|file, dedup by extid/url."""
+    is_dir = os.path.isdir(input_path)
+    paths = _iter_json_files(input_path) if is_dir else [input_path]
+    seen = set()
+    for fp in paths:
+        try:
+            for b in iter_json_bugs(fp):
+                key = b.get("extid") or b.get("url")
+                if key:
+                    if key in seen: continue
+                    seen.add(key)
+                yield b
+        except Exception as e:
+            if not is_dir: raise
+            print(f"[WARN] read fail: {fp}: {e}", file=sys.stderr); continue
 
 def collect_artifacts(crashes: List[Dict]) -> Dict[str, List[str]]:
     out = {"logs": [], "reports": [], "syz_repro": [], "c_repro": []}
@@ -253,6 +354,16 @@ def collect_artifacts(crashes: List[Dict]) -> Dict[str, List[str]]:
 
 # ---------------- Builder jsonl parsing ----------------
 
+def _logs_section(cont: str):
+    """Text after the line holding the first "# Logs" header, or None if absent (plain str.find, no regex)."""
+    idx = cont.find("# Logs")
+    if idx < 0:
+        return None
+    nl = cont.find("\n", idx)
+    if nl < 0 or nl + 1 >= len(cont):
+        return None
+    return cont[nl+1:].strip()
+
 def load_from_builder_jsonl(input_path: str) -> List[Dict]:
     rows = read_jsonl(input_path)
     bugs = []
@@ -268,9 +379,9 @@ def load_from_builder_jsonl(input_path: str) -> List[Dict]:
         log_txt = ""
         for um in user_msgs:
             cont = um.get("content","")
-            m = re.search(r"# Logs.*?\n([\s\S]+)$", cont)
-            if m:
-                log_txt = m.group(1).strip()
+            sec = _logs_section(cont)
+            if sec is not None:
+                log_txt = sec
                 break
         if log_txt:
             bug["crashes"].append({"Log": {"content": log_txt}})
@@ -279,60 +390,96 @@ def load_from_builder_jsonl(input_path: str) -> List[Dict]:
 
 # ---------------- Main build ----------------
 
-def build_round_files(bugs: List[Dict], out_dir: str):
-    ensure_dir(out_dir)
-    logs_rows, gold_short_rows, gold_full_rows = [], [], []
-
-    for b in bugs:
-        extid = b.get("extid") or b.get("url") or ""
-        arts = collect_artifacts(b.get("crashes") or [])
-        log_txt = pick_first_nonempty(arts["logs"])
-        crash_report = b.get("crash_report") or pick_first_nonempty(arts["reports"])
-
-        # SHORT gold（优先从 crash_report 抽锚点，否则从 log）
-        anchors = extract_anchor_lines(crash_report) if crash_report else []
-        if not anchors and log_txt:
-            anchors = extract_anchor_lines(log_txt)
-
-        # FULL gold（如果有官方 crash_report，直接用；否则从 log/report 尽量还原）
-        full_lines = []
-        if crash_report:
-            # 直接用原文（已是“长版”），必要时做一次标准化（仅去时间戳）
-            full_lines = [norm_line(x) for x in crash_report.splitlines() if x.strip()]
+def _process_bug(b: Dict):
+    """Build (logs_row, gold_short_row, gold_full_row) for one bug; None where a row is empty."""
+    extid = b.get("extid") or b.get("url") or ""
+    arts = collect_artifacts(b.get("crashes") or [])
+    log_txt = pick_first_nonempty(arts["logs"])
+    crash_report = b.get("crash_report") or pick_first_nonempty(arts["reports"])
+
+    # 没有 crash_report 时短/长 gold 都从同一份 log 抽：只切分+标准化一次
+    log_split = split_normalized(log_txt) if (log_txt and not crash_report) else None
+
+    # SHORT gold（优先从 crash_report 抽锚点，否则从 log）
+    anchors = extract_anchor_lines(crash_report) if crash_report else []
+    if not anchors and log_txt:
+        if log_split is not None:
+            raw_lines, lines = log_split
+            anchors = _anchors_from_lines(ln for raw, ln in zip(raw_lines, lines) if raw.strip())
         else:
-            candidate_text = crash_report or log_txt or ""
-            full_lines = extract_full_from_text(candidate_text)
-
-        if log_txt:
-            logs_rows.append({"id": extid, "log": log_txt})
-        if anchors:
-            gold_short_rows.append({"id": extid, "report": "\n".join(anchors)})
-        if full_lines:
-            gold_full_rows.append({"id": extid, "report": "\n".join(full_lines)})
+            anchors = extract_anchor_lines(log_txt)
 
+    # FULL gold（如果有官方 crash_report，直接用；否则从 log/report 尽量还原）
+    full_lines = []
+    if crash_report:
+        # 直接用原文（已是“长版”），必要时做一次标准化（仅去时间戳）
+        # 官方 report 通常已去掉时间戳：只探测首个非空行，没有时间戳就跳过逐行标准化
+        full_lines = [x for x in crash_report.splitlines() if x.strip()]
+        if full_lines and _TS_MATCH(full_lines[0]):
+            full_lines = [norm_line(x) for x in full_lines]
+    elif log_split is not None:
+        # 等价于 extract_full_from_text(log_txt)；其兜底结果正是上面的 anchors
+        full_lines = _full_from_lines(log_split[1]) or anchors
+
+    return (
+        {"id": extid, "log": log_txt} if log_txt else None,
+        {"id": extid, "report": "\n".join(anchors)} if anchors else None,
+        {"id": extid, "report": "\n".join(full_lines)} if full_lines else None,
+    )
+
+def _map_bugs(bugs: Iterable[Dict], workers: int, chunksize: int = 16):
+    """Yield _process_bug results in input order, in-process or on a process pool."""
+    if workers <= 1:
+        yield from map(_process_bug, bugs)
+        return
+    # Executor.map submits everything upfront; feed it bounded windows so the
+    # bug stream is never fully materialized.
+    window = workers * chunksize * 4
+    it = iter(bugs)
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        while True:
+            batch = list(islice(it, window))
+            if not batch: break
+            yield from ex.map(_process_bug, batch, chunksize=chunksize)
+
+def build_round_files(bugs: Iterable[Dict], out_dir: str, workers: int = 1):
+    """Process bugs (optionally on `workers` processes) and append each row to its jsonl as soon as it is ready."""
+    ensure_dir(out_dir)
     logs_path       = os.path.join(out_dir, "logs.jsonl")
     gold_short_path = os.path.join(out_dir, "gold_short.jsonl")
     gold_full_path  = os.path.join(out_dir, "gold_full.jsonl")
-    write_jsonl(logs_rows, logs_path)
-    write_jsonl(gold_short_rows, gold_short_path)
-    write_jsonl(gold_full_rows, gold_full_path)
-
-    print(f"[DONE] logs:       {len(logs_rows)} → {logs_path}")
-    print(f"[DONE] gold_short: {len(gold_short_rows)} → {gold_short_path}")
-    print(f"[DONE] gold_full:  {len(gold_full_rows)} → {gold_full_path}")
+    n_logs = n_short = n_full = 0
+
+    with open(logs_path, "wb") as f_logs, \
+         open(gold_short_path, "wb") as f_short, \
+         open(gold_full_path, "wb") as f_full:
+        for logs_row, short_row, full_row in _map_bugs(bugs, workers):
+            if logs_row:
+                f_logs.write(jsonl_line(logs_row)); n_logs += 1
+            if short_row:
+                f_short.write(jsonl_line(short_row)); n_short += 1
+            if full_row:
+                f_full.write(jsonl_line(full_row)); n_full += 1
+
+    print(f"[DONE] logs:       {n_logs} → {logs_path}")
+    print(f"[DONE] gold_short: {n_short} → {gold_short_path}")
+    print(f"[DONE] gold_full:  {n_full} → {gold_full_path}")
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--input", required=True, help="crawler dir|file or builder jsonl")
     ap.add_argument("--out", required=True, help="output directory")
     ap.add_argument("--source", choices=["crawler","builder_jsonl"], required=True)
+    ap.add_argument("--workers", type=int, default=1, help="extraction processes (default 1 = in-process; e.g. --workers $(nproc) to parallelize)")
     args = ap.parse_args()
 
-    bugs = load_all_bugs_from_crawler(args.input) if args.source == "crawler" else load_from_builder_jsonl(args.input)
-    if not bugs:
+    bugs = iter(load_all_bugs_from_crawler(args.input) if args.source == "crawler" else load_from_builder_jsonl(args.input))
+    first = next(bugs, None)
+    if first is None:
         print("[ERROR] No bugs found from input.", file=sys.stderr); sys.exit(2)
+    bugs = chain([first], bugs)
 
-    build_round_files(bugs, args.out)
+    build_round_files(bugs, args.out, workers=args.workers)
 
 if __name__ == "__main__":
     main()
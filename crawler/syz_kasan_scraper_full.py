@@ -9,26 +9,41 @@ import json
 import os
 import re
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Dict, Tuple, Optional
 from urllib.parse import urljoin, urlparse, parse_qs
 
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 from tqdm import tqdm
 
+# 优先使用 C 实现的 lxml 解析器；未安装时退回纯 Python 的 html.parser
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
 BASE = "https://syzkaller.appspot.com"
 FIXED = f"{BASE}/upstream/fixed"
 UA = {"User-Agent": "ksan-scraper/2.0 (+research)"}
 
 TEXT_PATH_RE = re.compile(r"/text\?tag=", re.I)
 SKIP_DOMAINS = {"groups.google.com", "lore.kernel.org", "lkml.org"}
+DOWNLOAD_WORKERS = 8
+
+# 复用同一个 Session：keep-alive 连接池，避免每个请求重新 TCP/TLS 握手
+SESSION = requests.Session()
+SESSION.headers.update(UA)
+SESSION.mount("https://", HTTPAdapter(pool_maxsize=DOWNLOAD_WORKERS))
 
 # -------------------- HTTP helpers --------------------
 def http_get(url: str, timeout=30, retries=3) -> requests.Response:
     last = None
     for i in range(retries):
         try:
-            r = requests.get(url, headers=UA, timeout=timeout)
+            r = SESSION.get(url, timeout=timeout)
             r.raise_for_status()
             return r
         except Exception as e:
@@ -37,7 +52,7 @@ def http_get(url: str, timeout=30, retries=3) -> requests.Response:
     raise RuntimeError(f"GET failed for {url}: {last}")
 
 def html(url: str) -> BeautifulSoup:
-    return BeautifulSoup(http_get(url).text, "html.parser")
+    return BeautifulSoup(http_get(url).content, HTML_PARSER)
 
 def is_syzkaller_text_link(href_abs: str) -> bool:
     if not href_abs:
@@ -129,9 +144,16 @@ def build_crashes_skeleton(soup: BeautifulSoup) -> Tuple[List[Dict], List[Tuple[
         rows.append(row)
     return rows, pending
 
+def fetch_text(href: str) -> Optional[str]:
+    """下载单个 /text? 资源；失败时返回错误占位文本（不抛异常）"""
+    try:
+        return http_get(href).text if is_syzkaller_text_link(href) else None
+    except Exception as e:
+        return f"[DOWNLOAD ERROR] {e}"
+
 # -------------------- per-bug pipeline with inner progress --------------------
-def parse_bug_with_progress(url: str, verbose=False) -> Dict:
-    """分阶段进度：抓HTML -> 解析字段/标题 -> 识别全局Report -> 逐条下载crashes中的文本资源"""
+def parse_bug_with_progress(url: str, verbose=False, workers: int = DOWNLOAD_WORKERS) -> Dict:
+    """分阶段进度：抓HTML -> 解析字段/标题 -> 识别全局Report -> 并发下载crashes中的文本资源"""
     # Stage 1: fetch HTML (all=1)
     url_all = ensure_all_view(url)
     with tqdm(total=1, desc="获取HTML", leave=False) as pbar:
@@ -169,24 +191,26 @@ def parse_bug_with_progress(url: str, verbose=False) -> Dict:
             unique_urls.append((r_idx, col_key, href))
             seen.add(href)
 
-    # Download with inner progress
+    # Download with inner progress（线程池并发下载，再按原顺序回填）
     crash_report = ""
     if unique_urls:
-        with tqdm(total=len(unique_urls), desc="下载文本", leave=False) as pbar:
-            for r_idx, col_key, href in unique_urls:
-                try:
-                    txt = http_get(href).text if is_syzkaller_text_link(href) else None
-                except Exception as e:
-                    txt = f"[DOWNLOAD ERROR] {e}"
-                if r_idx == "__CRASH_REPORT__":
-                    crash_report = txt or crash_report
-                else:
-                    # fill into crashes row cell
-                    if isinstance(r_idx, int) and 0 <= r_idx < len(crashes):
-                        cell = crashes[r_idx].get(col_key)
-                        if isinstance(cell, dict):
-                            cell["content"] = txt
+        texts = {}
+        with tqdm(total=len(unique_urls), desc="下载文本", leave=False) as pbar, \
+             ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+            futs = {ex.submit(fetch_text, href): href for _, _, href in unique_urls}
+            for fut in as_completed(futs):
+                texts[futs[fut]] = fut.result()
                 pbar.update(1)
+        for r_idx, col_key, href in unique_urls:
+            txt = texts.get(href)
+            if r_idx == "__CRASH_REPORT__":
+                crash_report = txt or crash_report
+            else:
+                # fill into crashes row cell
+                if isinstance(r_idx, int) and 0 <= r_idx < len(crashes):
+                    cell = crashes[r_idx].get(col_key)
+                    if isinstance(cell, dict):
+                        cell["content"] = txt
 
     # Fallback: if crash_report still empty, try first row's Report
     if not crash_report and crashes:
@@ -234,14 +258,13 @@ WINDOWS_RESERVED = {
     *(f"COM{i}" for i in range(1,10)),
     *(f"LPT{i}" for i in range(1,10)),
 }
+# Windows 禁用字符 + 控制字符 -> "_"：一次 str.translate 完成替换
+_FILENAME_TRANS = str.maketrans({c: "_" for c in '<>:"/\\|?*' + "".join(map(chr, range(0x20)))})
+
 def safe_filename(name: str, max_len: int = 120) -> str:
     """将漏洞标题转换为可用的文件名"""
-    # 去掉多余空格
-    name = re.sub(r"\s+", " ", name.strip())
-    # 替换 Windows 禁用字符
-    name = re.sub(r'[<>:"/\\|?*\x00-\x1F]', "_", name)
-    # 去掉尾部的点和空格
-    name = name.rstrip(" .")
+    # 合并多余空格，替换 Windows 禁用字符，去掉尾部的点和空格
+    name = " ".join(name.split()).translate(_FILENAME_TRANS).rstrip(" .")
     # 截断过长
     if len(name) > max_len:
         name = name[:max_len].rstrip(" .")
@@ -256,6 +279,7 @@ def main():
     ap.add_argument("--sleep", type=float, default=0.5, help="每条之间休眠秒数")
     ap.add_argument("--outdir", default="./result/bug02", help="输出目录（单条JSON会写在这里）")
     ap.add_argument("--combine", action="store_true", help="同时输出合并的 bugs.json")
+    ap.add_argument("--workers", type=int, default=DOWNLOAD_WORKERS, help="每条漏洞并发下载文本的线程数")
     args = ap.parse_args()
 
     items = list_fixed(args.filter)
@@ -266,7 +290,7 @@ def main():
     for i, it in enumerate(tqdm(items, desc="Bug级进度", unit="bug"), 1):
         print(f"\n[#{i}] {it['title']}")
         try:
-            data = parse_bug_with_progress(it["url"])
+            data = parse_bug_with_progress(it["url"], workers=args.workers)
             all_out.append(data)
             title = it["title"]  # 这里是 fixed 页面原来的标题
             fname = safe_filename(title)
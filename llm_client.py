@@ -2,13 +2,63 @@
 import os, json, time, requests, re
 from typing import List, Dict, Any, Optional
 
+try:
+    import orjson
+except ImportError:  # falls back to the stdlib json module
+    orjson = None
+try:
+    import httpx
+except ImportError:  # 没装 httpx 时继续走 requests
+    httpx = None
+try:
+    import h2  # noqa: F401  httpx 的 HTTP/2 支持依赖 h2（pip install "httpx[http2]"）
+    _HAS_H2 = True
+except ImportError:
+    _HAS_H2 = False
+
+def _dumps_payload(payload: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload).encode("utf-8")
+
+def _loads_body(raw: bytes):
+    """解析响应 bytes（不先解码成 str）；非法 JSON 返回 None。"""
+    try:
+        return orjson.loads(raw) if orjson is not None else json.loads(raw)
+    except Exception:
+        return None
+
+# 彻底关闭 urllib3 自动重试的 Retry：import 时构造一次，所有 Session 共用（Retry 不可变，
+# increment() 总是返回新对象）；某些精简环境没有 urllib3.retry，也无所谓
+try:
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    _NO_RETRY = Retry(
+        total=0, connect=0, read=0, redirect=0, status=0,
+        backoff_factor=0.0, allowed_methods=False, raise_on_status=False
+    )
+except Exception:
+    HTTPAdapter = _NO_RETRY = None
+
+def _build_no_retry_adapter(pool_size: int = 10):
+    """
+    每个 Session 各自一个不重试的 HTTPAdapter：adapter 里是各自的 urllib3 连接池，
+    关闭一个 Session 不会关掉别的 LLMClient 的连接。缺少依赖时返回 None。
+    """
+    if _NO_RETRY is None:
+        return None
+    # pool_maxsize 要 >= 并发线程数，否则多出的 keep-alive 连接用完即丢、下次重新握手；
+    # 留一倍余量：超时的调用在后台跑完之前仍占着连接
+    return HTTPAdapter(max_retries=_NO_RETRY, pool_connections=pool_size, pool_maxsize=pool_size * 2)
+
 class LLMClient:
     """
     关键变化：
     - 默认不做内部重试（retries=0），把重试/降载交给上层自适应队列处理；
     - 拆分 (connect_timeout, read_timeout)，确保单次 HTTP 调用最久不会超过 read_timeout；
     - 关闭 requests/urllib3 的隐式重试，避免 5xx 被悄悄重试拖时；
-    - 保证至少执行 1 次请求（retries=0 时也会跑 1 次）。
+    - 保证至少执行 1 次请求（retries=0 时也会跑 1 次）；
+    - 安装了 httpx 时优先用 httpx.Client（有 h2 则启用 HTTP/2 多路复用，httpx 本身不做重试），否则回退 requests。
     """
     def __init__(self,
                  api_url: str = None,
@@ -18,7 +68,8 @@ class LLMClient:
                  retries: int = 0,                # 默认 0：不在这里重试
                  backoff: float = 1.0,            # 保留参数，但我们不再内部指数退避
                  connect_timeout: int = 10,       # 新增：连接超时
-                 read_timeout: int = 55):         # 新增：读取超时（建议 < 外层 _run_with_timeout）
+                 read_timeout: int = 55,          # 新增：读取超时（建议 < 外层 _run_with_timeout）
+                 pool_size: int = 10):            # keep-alive 连接池大小，建议 >= 调用方并发线程数
         self.api_url = api_url or os.environ.get("API_URL")
         self.api_key = api_key or os.environ.get("API_KEY")
         self.model = model or os.environ.get("MODEL")
@@ -27,25 +78,52 @@ class LLMClient:
         self.backoff = float(backoff)
         self.connect_timeout = int(connect_timeout)
         self.read_timeout = int(read_timeout)
+        self.pool_size = max(1, int(pool_size))
 
         if not (self.api_url and self.api_key and self.model):
             raise RuntimeError("Missing API_URL/API_KEY/MODEL; set env vars or config.json")
 
-        # ---- 使用 Session + 彻底关闭 urllib3 的自动重试 ----
-        self._session = requests.Session()
-        try:
-            from requests.adapters import HTTPAdapter
-            from urllib3.util.retry import Retry
-            retry = Retry(
-                total=0, connect=0, read=0, redirect=0, status=0,
-                backoff_factor=0.0, allowed_methods=False, raise_on_status=False
+        self._client = None
+        self._session = None
+        if httpx is not None:
+            # ---- httpx.Client：keep-alive 连接池 + HTTP/2（若可用），超时同样拆分 connect/read ----
+            self._client = httpx.Client(
+                http2=_HAS_H2,
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=self.pool_size * 2,
+                                    max_keepalive_connections=self.pool_size),
             )
-            adapter = HTTPAdapter(max_retries=retry)
-            self._session.mount("http://", adapter)
-            self._session.mount("https://", adapter)
-        except Exception:
-            # 某些精简环境没有 urllib3.retry，也无所谓
-            pass
+        else:
+            # ---- 使用 Session + 彻底关闭 urllib3 的自动重试（本 Session 自己的 adapter，连接池按并发度设大小） ----
+            self._session = requests.Session()
+            adapter = _build_no_retry_adapter(self.pool_size)
+            if adapter is not None:
+                self._session.mount("http://", adapter)
+                self._session.mount("https://", adapter)
+
+    def close(self) -> None:
+        """关闭底层连接池（httpx.Client 或 requests.Session）；可重复调用。"""
+        if self._client is not None:
+            self._client.close()
+        if self._session is not None:
+            self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _post(self, headers: Dict[str, str], body):
+        """发送一次 POST；返回的响应对象 httpx/requests 都提供 status_code/text/json()。"""
+        if self._client is not None:
+            return self._client.post(self.api_url, headers=headers, content=body)
+        return self._session.post(
+            self.api_url,
+            headers=headers,
+            data=body,
+            timeout=(self.connect_timeout, self.read_timeout)  # (connect, read)
+        )
 
     # -------- helpers 保持不变（兼容多家返回结构） --------
     @staticmethod
@@ -131,37 +209,37 @@ class LLMClient:
             "messages": messages
         }
 
+        body = _dumps_payload(payload)   # 只序列化一次，重试时复用
+
         last_err = None
         for attempt in range(1, tries + 1):
             try:
-                r = self._session.post(
-                    self.api_url,
-                    headers=headers,
-                    data=json.dumps(payload),
-                    timeout=(self.connect_timeout, self.read_timeout)  # (connect, read)
-                )
+                r = self._post(headers, body)
 
                 # 非 2xx：直接抛给上层（不要在这里重试 5xx）
                 if r.status_code < 200 or r.status_code >= 300:
-                    body = (r.text or "")[:8000]
-                    raise RuntimeError(f"HTTP {r.status_code} from LLM server. Body head:\n{body}")
+                    head = (r.text or "")[:8000]
+                    raise RuntimeError(f"HTTP {r.status_code} from LLM server. Body head:\n{head}")
 
-                # JSON 或纯文本兜底
-                try:
-                    data = r.json()
-                except Exception:
-                    data = self._strip_noise_to_json(r.text)
+                # JSON 或纯文本兜底：直接解析原始 bytes，只有兜底分支才解码出 text
+                data = _loads_body(r.content)
+                text = None
+                if data is None:
+                    text = r.text or ""
+                    data = self._strip_noise_to_json(text)
 
                 if data is not None:
                     content = self._extract_content_from_json(data)
                     if isinstance(content, str) and content.strip():
                         return content.strip()
                 else:
-                    if self._looks_like_plaintext(r.text):
-                        return (r.text or "").strip()
+                    if self._looks_like_plaintext(text):
+                        return text.strip()
 
                 # 到这里说明没有拿到有效文本
-                snippet = (r.text or "")[:8000]
+                if text is None:
+                    text = r.text or ""
+                snippet = text[:8000]
                 last_err = RuntimeError(f"LLM response unrecognized/empty. Snippet:\n{snippet}")
 
             except Exception as e:
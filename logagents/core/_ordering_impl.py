@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+Label-only index loops used by ordering.order_normalize.
+
+Everything here works on the per-line _classify() labels (no regex, no closures),
+fully annotated so the module can be AOT-compiled with mypyc:
+
+    mypyc logagents/core/_ordering_impl.py
+
+The compiled extension is picked up by the normal import (extension modules win
+over the .py of the same name); without it this file runs as plain Python.
+"""
+
+from typing import FrozenSet, List, Optional
+
+
+def block_end(labels: List[Optional[str]], start: int, hard: FrozenSet[str]) -> int:
+    """Index of the first hard-break line after start (len(labels) if none)."""
+    n = len(labels)
+    j = start + 1
+    while j < n:
+        lab = labels[j]
+        if lab is not None and lab in hard:
+            break
+        j += 1
+    return j
+
+
+def find_task_end(labels: List[Optional[str]], start: int, stop: int) -> int:
+    """First "T_END" in labels[start:stop], not crossing another "CT"; -1 if none."""
+    k = start
+    while k < stop:
+        lab = labels[k]
+        if lab == "T_END":
+            return k
+        if lab == "CT":  # don't scan across another CT
+            return -1
+        k += 1
+    return -1
@@ -2,37 +2,45 @@
 # -*- coding: utf-8 -*-
 import re
 from typing import List
-from .sections import extract_sections_from_log
+from .sections import extract_sections_from_log, SECTION_SPECS
 from .ordering import _normalize_for_match
 
+# Core section headers checked against the (normalized) candidate; re.M so that
+# `^` anchors at every line of the joined text.
+_NEEDS = [(key, re.compile(pat, re.I | re.M)) for key, pat in (
+    ("CALL",  r"^Call Trace:"),
+    ("ALLOC", r"^Allocated by task"),
+    ("FREED", r"^Freed by task"),
+    ("BUGGY", r"^The buggy address belongs to"),
+    ("MEM",   r"^Memory state around"),
+)]
+
 def augment_missing_sections(all_lines_in_log: List[str], candidate_text: str) -> str:
-    cand_lines = [ln for ln in candidate_text.splitlines() if ln.strip()]
+    return "\n".join(augment_missing_sections_lines(all_lines_in_log, candidate_text.splitlines()))
+
+def augment_missing_sections_lines(all_lines_in_log: List[str], candidate_lines: List[str]) -> List[str]:
+    """同 augment_missing_sections，但输入/输出都是行列表，省掉 split/join 往返。"""
+    cand_lines = [ln for ln in candidate_lines if ln.strip()]
     log_secs = extract_sections_from_log(all_lines_in_log)
-    needs = {
-        "CALL": r"^Call Trace:",
-        "ALLOC": r"^Allocated by task",
-        "FREED": r"^Freed by task",
-        "BUGGY": r"^The buggy address belongs to",
-        "MEM": r"^Memory state around",
-    }
-    def _present(header_regex):
-        rx = re.compile(header_regex, re.I)
-        return any(rx.search(_normalize_for_match(ln)) for ln in cand_lines)
-    for key, header_pat in needs.items():
-        if key in log_secs and not _present(header_pat):
+    # normalize once; appended lines are folded in so later checks still see them
+    norm_joined = "\n".join(_normalize_for_match(ln) for ln in cand_lines)
+    for key, rx in _NEEDS:
+        if key in log_secs and not rx.search(norm_joined):
+            start = len(cand_lines)
             # 段间留一空行，避免紧贴 Call Trace 造成“视觉上像在 Call Trace 内”
             if cand_lines and cand_lines[-1].strip():
                 cand_lines.append("")
             for ln in log_secs[key]:
                 if ln.strip() and '?' not in ln and '？' not in ln:
                     cand_lines.append(ln)
-
-
-    return "\n".join(cand_lines)
+            if len(cand_lines) > start:
+                added = "\n".join(_normalize_for_match(ln) for ln in cand_lines[start:])
+                norm_joined = f"{norm_joined}\n{added}" if start else added
+    return cand_lines
 
 # Diagnostics tail augmentation
 DIAG_PATTERNS = [
-    ("MEM_HEX", re.compile(r"^Memory state around.*$", re.I)),
+    ("MEM_HEX", re.compile(r"^Memory state around", re.I)),
     ("PAGE_OWNER", re.compile(r"\bpage_owner\b", re.I)),
     ("PAGE_DUMP", re.compile(r"^page:\s*[0-9a-fx]+", re.I)),
     ("SLAB_OBJ", re.compile(r"\b(slab|kmalloc|kmem_cache|object)\b", re.I)),
@@ -40,61 +48,110 @@ DIAG_PATTERNS = [
     ("FTRACE", re.compile(r"\bftrace\b|\btracing\b|^trace:", re.I)),
     ("REGS", re.compile(r"\bRIP:|^RSP:|^RAX:|^RBX:|^RDX:|^RCX:|^RDI:|^RSI:|^RBP:|^R\d{2}:|^EIP:|^ESP:", re.I)),
 ]
+# All of DIAG_PATTERNS as one alternation: a single search per line, m.lastgroup names the hit.
+_DIAG_UNION = re.compile("|".join(f"(?P<{name}>{rx.pattern})" for name, rx in DIAG_PATTERNS), re.I)
 
-def _collect_block_from(lines, start_idx, max_len=800, stop_headers=None):
-    out = []
-    n = len(lines); i = start_idx
-    while i < n and len(out) < max_len:
-        ln = lines[i].rstrip("\n")
-        out.append(ln)
-        if stop_headers:
-            if i+1 < n and any(hdr.search(lines[i+1]) for hdr in stop_headers):
+# 两级判定 DIAG 行（ASCII 行上与 _DIAG_UNION.search 等价）：
+# (a) 行首字面量前缀（小写）：DIAG_PATTERNS 里 ^ 锚定的字面量分支，命中即是；
+#     "page:" 还要用 PAGE_DUMP 确认后面的地址
+# (b) 剩下的非锚定分支 + ^R\d{2}:，一条正则
+# 非 ASCII 行（s/i 等有 ſ、ı 之类的 re.I 变体）直接走完整的 _DIAG_UNION。
+_FAST_PREFIXES = ("memory state around", "trace:", "rsp:", "rax:", "rbx:", "rdx:", "rcx:",
+                  "rdi:", "rsi:", "rbp:", "eip:", "esp:")
+_FAST_HEAD = max(map(len, _FAST_PREFIXES))
+_PAGE_DUMP = dict(DIAG_PATTERNS)["PAGE_DUMP"]
+_DIAG_REST = re.compile(
+    r"\bpage_owner\b|\b(?:slab|kmalloc|kmem_cache|object)\b|\bDisassembly\b|\bCode:\b"
+    r"|\bftrace\b|\btracing\b|\bRIP:|^R\d{2}:",
+    re.I,
+)
+
+def _is_diag_line(ln: str) -> bool:
+    if not ln.isascii():
+        return _DIAG_UNION.search(ln) is not None
+    head = ln[:_FAST_HEAD].lower()
+    if head.startswith(_FAST_PREFIXES):
+        return True
+    if head.startswith("page:") and _PAGE_DUMP.match(ln):
+        return True
+    return _DIAG_REST.search(ln) is not None
+
+# SECTION_SPECS 的所有段头合成一条正则，只编译一次；每行一次 search 代替 any(...)
+_STOP_RX = re.compile("|".join(f"(?:{p.pattern})" for _, p in SECTION_SPECS), re.I)
+
+def _collect_block_from(lines, start_idx, max_len=800, stop_rx=None):
+    """从 start_idx 起收集至多 max_len 行，下一行是段头（stop_rx 命中）时停止。"""
+    end = min(len(lines), start_idx + max_len)
+    if stop_rx is not None:
+        search = stop_rx.search
+        for k in range(start_idx + 1, end):
+            if search(lines[k]):
+                end = k
                 break
-        i += 1
-    return out
+    return [ln.rstrip("\n") for ln in lines[start_idx:end]]
 
 def _find_diag_blocks(lines: List[str]) -> List[List[str]]:
-    from .sections import SECTION_SPECS
     n = len(lines)
-    stop_headers = [p for _, p in SECTION_SPECS]
     diag_blocks = []
     i = 0
     while i < n:
         ln = lines[i]
-        matched = None
-        for name, rx in DIAG_PATTERNS:
-            if rx.search(ln):
-                matched = name
-                break
-        if matched:
-            block = _collect_block_from(lines, i, max_len=800, stop_headers=stop_headers)
+        if ln and _is_diag_line(ln):
+            block = _collect_block_from(lines, i, max_len=800, stop_rx=_STOP_RX)
             diag_blocks.append(block)
             i += len(block)
         else:
             i += 1
     return diag_blocks
 
+def _norm_line(x: str) -> str:
+    # 等价于去掉 ^\s*\[[^\]]+\]\s* 时间戳前缀后把 \s+ 压成单空格再 strip，
+    # 但只用 str 的 C 实现方法（lstrip/find/split/join），不走正则
+    y = x.lstrip()
+    if y[:1] == "[":
+        k = y.find("]", 1)
+        if k > 1:
+            y = y[k + 1:]
+    return " ".join(y.split())
+
 def _normalize_text_block(s: str) -> str:
-    import re
-    _TS_PREFIX = re.compile(r"^\s*\[[^\]]+\]\s*")
-    _WS_MULTI  = re.compile(r"\s+")
-    def _norm_line(x): 
-        x = _TS_PREFIX.sub("", x.rstrip("\r\n")); 
-        return _WS_MULTI.sub(" ", x).strip()
     return "\n".join(_norm_line(ln) for ln in s.splitlines())
 
+def _block_heads(block: List[str]) -> tuple:
+    return tuple(_normalize_text_block(x) for x in block[:2] if x.strip())
+
 def _cand_contains_block(cand_text_norm: str, block: List[str]) -> bool:
-    head_two = [ _normalize_text_block(x) for x in block[:2] if x.strip() ]
+    head_two = _block_heads(block)
     return all((h and h in cand_text_norm) for h in head_two) if head_two else False
 
 def augment_diagnostics_tail(all_lines_in_log: List[str], candidate_text: str) -> str:
-    cand_norm = _normalize_text_block(candidate_text)
     blocks = _find_diag_blocks(all_lines_in_log)
     if not blocks:
         return candidate_text
-    out = candidate_text.splitlines()
+    return "\n".join(_diag_tail(blocks, candidate_text.splitlines()))
+
+def augment_diagnostics_tail_lines(all_lines_in_log: List[str], candidate_lines: List[str]) -> List[str]:
+    """行列表版本：结果与 augment_diagnostics_tail(all_lines, "\n".join(candidate_lines)).splitlines() 对应。"""
+    blocks = _find_diag_blocks(all_lines_in_log)
+    if not blocks:
+        return candidate_lines
+    out = list(candidate_lines)
+    if out and out[-1] == "":
+        out.pop()          # 文本版本里末尾空行在 splitlines() 时会消失
+    return _diag_tail(blocks, out)
+
+def _diag_tail(blocks: List[List[str]], out: List[str]) -> List[str]:
+    # 候选只归一化一次；已追加的块只记 2 行头签名和各行归一化结果（集合，O(1) 查找），
+    # 头行已作为整行出现在之前追加的块里时同样算已包含，不重复追加
+    cand_norm = "\n".join(_norm_line(ln) for ln in out)
+    added_signatures = set()
+    added_lines = set()
     for blk in blocks:
-        if not _cand_contains_block(cand_norm, blk):
-            out.extend(ln for ln in blk if ln.strip())
-            cand_norm += "\n" + _normalize_text_block("\n".join(blk))
-    return "\n".join(out)
+        sig = _block_heads(blk)
+        if sig and all(sig) and (sig in added_signatures
+                                 or all(h in added_lines or h in cand_norm for h in sig)):
+            continue
+        out.extend(ln for ln in blk if ln.strip())
+        added_signatures.add(sig)
+        added_lines.update(_norm_line(ln) for ln in blk)
+    return out
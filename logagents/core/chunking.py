@@ -1,9 +1,10 @@
 
 # -*- coding: utf-8 -*-
-import re, time, threading
+import os, re, time, bisect, threading
 from typing import List, Tuple, Dict, Any
 from dataclasses import dataclass
 from collections import deque
+from functools import lru_cache
 from concurrent.futures import ThreadPoolExecutor, TimeoutError as FTimeout
 from tqdm import tqdm
 
@@ -20,48 +21,110 @@ RE_SECONDARY = [
     re.compile(r"\bThe buggy address belongs to\b", re.I),
     re.compile(r"\bMemory state around\b", re.I),
     re.compile(r"\bpage_owner\b", re.I),
-    re.compile(r"^page:\s*[0-9a-fx]+", re.I),
     re.compile(r"\b(slab|kmalloc|kmem_cache|object)\b", re.I),
     re.compile(r"\bDisassembly\b|\bCode:\b", re.I),
-    re.compile(r"\bftrace\b|\btracing\b|^trace:", re.I),
+    re.compile(r"\bftrace\b|\btracing\b", re.I),
+    # 行首锚定的两条：由下面的前缀层判定，不进整段扫描
+    re.compile(r"^page:\s*[0-9a-fx]+", re.I),
+    re.compile(r"^trace:", re.I),
 ]
 
+# 前缀层：^page: / ^trace: 只可能命中以这两个字面量（忽略大小写）开头的行。
+# 这几个字母没有非 ASCII 的大小写变体，lower().startswith 与 re.I 的 ^ 匹配完全一致；
+# "trace:" 命中即算，"page:" 还要用原正则确认后面的地址。
+_FAST_PREFIXES = ("page:", "trace:")
+_FAST_HEAD = max(map(len, _FAST_PREFIXES))
+_PAGE_DUMP = RE_SECONDARY[-2]
+_SECONDARY_SCAN = RE_SECONDARY[:-2]
+
+def _scoped(p):
+    return f"(?i:{p.pattern})" if p.flags & re.I else f"(?:{p.pattern})"
+
+# 一组正则合成一条，对整段日志扫描（各自的 re.I 用局部 flag 保留）；
+# \s 换成 [^\S\n]，保证匹配不会跨行，和逐行 search 的结果一致
+def _union(patterns):
+    return re.compile(
+        "|".join(_scoped(p) for p in patterns).replace(r"\s", r"[^\S\n]"),
+        re.M,
+    )
+
+_ANCHOR_UNION    = _union(RE_ANCHORS + _SECONDARY_SCAN)
+_PRIMARY_UNION   = _union(RE_ANCHORS)
+_SECONDARY_UNION = _union(_SECONDARY_SCAN)
+
+def _prefix_lines(lines: List[str]) -> List[int]:
+    r"""前缀层：命中 ^page:\s*[0-9a-fx]+ 或 ^trace: 的行号。"""
+    out = []
+    for i, ln in enumerate(lines):
+        head = ln[:_FAST_HEAD].lower()
+        if head.startswith(_FAST_PREFIXES) and (head[0] == "t" or _PAGE_DUMP.match(ln)):
+            out.append(i)
+    return out
+
 def chunk_lines(lines: List[str], max_lines: int, stride: int) -> List[Tuple[int, int]]:
-    spans = []
+    # 窗口起点依次为 0, stride, 2*stride, ...，直到某个窗口覆盖到末尾；直接算出窗口个数
     n = len(lines)
-    i = 0
-    while i < n:
-        j = min(i + max_lines, n)
-        spans.append((i, j))
-        if j == n:
-            break
-        i = max(0, j - (max_lines - stride))
-    return spans
+    if n == 0:
+        return []
+    if max_lines >= n:
+        return [(0, n)]
+    step = max(1, stride)
+    last = -(-(n - max_lines) // step)     # ceil((n - max_lines) / step)
+    return [(s, min(s + max_lines, n)) for s in range(0, min(last * step + 1, n), step)]
+
+def _with_prefix_lines(idxs: List[int], lines: List[str]) -> List[int]:
+    extra = _prefix_lines(lines)
+    return sorted(set(idxs).union(extra)) if extra else idxs
 
 def _find_anchor_lines(lines: List[str]) -> List[int]:
-    idxs = []
+    return _with_prefix_lines(_find_lines_matching(lines, _ANCHOR_UNION), lines)
+
+def find_anchor_lines(lines: List[str]) -> Dict[str, List[int]]:
+    """ExplainRecorder.note_anchors 用：命中 RE_ANCHORS / RE_SECONDARY 任一条的行号。"""
+    return {
+        "primary": _find_lines_matching(lines, _PRIMARY_UNION),
+        "secondary": _with_prefix_lines(_find_lines_matching(lines, _SECONDARY_UNION), lines),
+    }
+
+def _find_lines_matching(lines: List[str], rx) -> List[int]:
+    """等价于 [i for i, l in enumerate(lines) if rx.search(l)]（lines 不含换行符）。"""
+    if not lines:
+        return []
+    joined = "\n".join(lines)
+    starts = [0] * len(lines)          # 每行在 joined 中的起始偏移
+    pos = 0
     for i, ln in enumerate(lines):
-        if any(p.search(ln) for p in RE_ANCHORS) or any(p.search(ln) for p in RE_SECONDARY):
-            idxs.append(i)
-    seen = set(); out = []
-    for x in idxs:
-        if x not in seen:
-            seen.add(x); out.append(x)
+        starts[i] = pos
+        pos += len(ln) + 1
+    out = []
+    search = rx.search
+    m = search(joined)
+    while m is not None:
+        i = bisect.bisect_right(starts, m.start()) - 1
+        out.append(i)
+        if i + 1 >= len(lines):
+            break
+        m = search(joined, starts[i + 1])   # 本行已命中，直接跳到下一行
     return out
 
-def _merge_intervals(intervals: List[Tuple[int, int]], max_lines: int) -> List[Tuple[int, int]]:
+def _merge_intervals(intervals: List[Tuple[int, int]], max_lines: int, presorted: bool = False) -> List[Tuple[int, int]]:
     if not intervals:
         return []
-    intervals = sorted(intervals)
-    merged: List[List[int]] = []
-    for s, e in intervals:
-        if not merged or s > merged[-1][1] - 10:
-            merged.append([s, e])
+    if not presorted:
+        intervals = sorted(intervals)
+    out: List[Tuple[int, int]] = []
+    cs, ce = intervals[0]
+    for s, e in intervals[1:]:
+        if s > ce - 10:
+            out.append((cs, ce))
+            cs, ce = s, e
         else:
-            merged[-1][1] = max(merged[-1][1], e)
-            if merged[-1][1] - merged[-1][0] > max_lines:
-                merged[-1][1] = merged[-1][0] + max_lines
-    return [(s, e) for s, e in merged]
+            if e > ce:
+                ce = e
+            if ce - cs > max_lines:
+                ce = cs + max_lines
+    out.append((cs, ce))
+    return out
 
 def anchor_spans(lines: List[str], max_lines: int, pre: int = 20) -> List[Tuple[int, int]]:
     n = len(lines)
@@ -73,7 +136,7 @@ def anchor_spans(lines: List[str], max_lines: int, pre: int = 20) -> List[Tuple[
         s = max(0, a - pre)
         e = min(n, s + max_lines)
         intervals.append((s, e))
-    return _merge_intervals(intervals, max_lines)
+    return _merge_intervals(intervals, max_lines, presorted=True)   # anchors 已按行号升序
 
 def make_windows(lines: List[str], max_lines: int, stride: int):
     spans = anchor_spans(lines, max_lines=max_lines, pre=20)
@@ -81,6 +144,59 @@ def make_windows(lines: List[str], max_lines: int, stride: int):
         return spans, "anchor"
     return chunk_lines(lines, max_lines=max_lines, stride=stride), "sliding"
 
+def pack_chunk_groups(chunk_ids: List[str], gid2text: Dict[str, str], char_budget: int, max_group: int = 8) -> List[List[str]]:
+    """
+    按顺序把相邻 chunk 打包成一组（一次 LLM 调用），每组文本总长不超过 char_budget，
+    这样 build_fx_fz_prompts 不会截断组内任何 chunk；单个超长 chunk 自成一组。
+    """
+    groups: List[List[str]] = []
+    cur: List[str] = []; used = 0
+    for gid in chunk_ids:
+        n = len(gid2text.get(gid, ""))
+        if cur and (used + n > char_budget or len(cur) >= max_group):
+            groups.append(cur); cur = []; used = 0
+        cur.append(gid); used += n
+    if cur:
+        groups.append(cur)
+    return groups
+
+class BatchController:
+    """
+    按最近调用的耗时调整每次调用打包的 chunk 数（AIMD）：
+    - 超时立刻减半；
+    - 攒够一窗观测后，若 p95 耗时远低于超时、失败率也低，就 +1（直到 max_size）；
+    每次调整后清空窗口，按新的组大小重新观测。线程安全，供多个工作线程共同 observe。
+    """
+    def __init__(self, timeout_s: float, start: int = 1, max_size: int = 8, window: int = 16,
+                 headroom: float = 0.5, max_fail_rate: float = 0.1):
+        self.timeout_s = float(timeout_s)
+        self.max_size = max(1, int(max_size))
+        self.size = min(max(1, int(start)), self.max_size)
+        self.window = max(1, int(window))
+        self.headroom = headroom
+        self.max_fail_rate = max_fail_rate
+        self._obs = deque(maxlen=self.window)   # (input_chars, latency, failed)
+        self._lock = threading.Lock()
+
+    def observe(self, input_chars: int, latency: float, status: str = "ok"):
+        with self._lock:
+            if status == "timeout":
+                self.size = max(1, self.size // 2)
+                self._obs.clear()
+                return
+            self._obs.append((input_chars, latency, status == "bad"))
+
+    def suggest_group_size(self) -> int:
+        with self._lock:
+            if len(self._obs) >= self.window and self.size < self.max_size:
+                lat = sorted(o[1] for o in self._obs)
+                p95 = lat[min(len(lat) - 1, int(len(lat) * 0.95))]
+                fail_rate = sum(o[2] for o in self._obs) / len(self._obs)
+                if p95 < self.headroom * self.timeout_s and fail_rate <= self.max_fail_rate:
+                    self.size += 1
+                    self._obs.clear()
+            return self.size
+
 class Task:
     __slots__ = ("gids", "tok_budget", "max_lines", "stride", "depth", "fewshot_level")
     def __init__(self, gids, tok_budget, max_lines, stride, depth=0, fewshot_level=2):
@@ -91,6 +207,11 @@ class Task:
         self.depth = depth
         self.fewshot_level = fewshot_level
 
+@lru_cache(maxsize=None)
+def _shrink(value: int, factor: float, floor: int) -> int:
+    # 预算阶梯只有少数几档（深度 ≤ SPLIT_MAX_DEPTH + SHRINK_MAX_DEPTH），每档算一次后复用
+    return max(int(value * factor), floor)
+
 def schedule_adaptive(task: Task,
                       SPLIT_MAX_DEPTH=2,
                       SHRINK_MAX_DEPTH=3,
@@ -101,41 +222,63 @@ def schedule_adaptive(task: Task,
     new_tasks = []
     if len(task.gids) > 1 and task.depth < SPLIT_MAX_DEPTH:
         mid = (len(task.gids)+1)//2
-        next_tok = max(int(task.tok_budget*TOK_SHRINK_FACTOR), MIN_TOK)
-        next_ln  = max(int(task.max_lines*LINE_SHRINK_FACTOR), MIN_LINES)
+        next_tok = _shrink(task.tok_budget, TOK_SHRINK_FACTOR, MIN_TOK)
+        next_ln  = _shrink(task.max_lines, LINE_SHRINK_FACTOR, MIN_LINES)
         next_fs  = max(task.fewshot_level - 1, 0)
         left  = Task(task.gids[:mid], next_tok, next_ln, task.stride, depth=task.depth+1, fewshot_level=next_fs)
         right = Task(task.gids[mid:], next_tok, next_ln, task.stride, depth=task.depth+1, fewshot_level=next_fs)
         new_tasks.extend([left, right]); return new_tasks
     if task.depth < SHRINK_MAX_DEPTH:
-        next_tok = max(int(task.tok_budget*TOK_SHRINK_FACTOR), MIN_TOK)
-        next_ln  = max(int(task.max_lines*LINE_SHRINK_FACTOR), MIN_LINES)
+        next_tok = _shrink(task.tok_budget, TOK_SHRINK_FACTOR, MIN_TOK)
+        next_ln  = _shrink(task.max_lines, LINE_SHRINK_FACTOR, MIN_LINES)
         next_fs  = max(task.fewshot_level - 1, 0)
         shrinked = Task(task.gids, next_tok, next_ln, task.stride, depth=task.depth+1, fewshot_level=next_fs)
         new_tasks.append(shrinked); return new_tasks
     return new_tasks
 
+# 所有 _run_with_timeout 共用的线程池（避免每次调用都新建/销毁线程），第一次用到时才建。
+# 排队时间也会算进超时，而超时的调用在后台跑完前仍占着线程：默认按 2 * 调用方并发度设大小
+# （调用方用 configure_timeout_pool(LLM_CONCURRENCY) 告知），LOGAGENTS_TIMEOUT_POOL 可显式指定
+_TIMEOUT_POOL = None
+_TIMEOUT_POOL_LOCK = threading.Lock()
+_TIMEOUT_POOL_ENV = int(os.environ.get("LOGAGENTS_TIMEOUT_POOL") or 0)   # 0 = 未指定
+_TIMEOUT_POOL_SIZE = _TIMEOUT_POOL_ENV or 8   # 下次建池用的大小
+_TIMEOUT_POOL_WORKERS = 0                      # 当前 _TIMEOUT_POOL 的大小（未建池时为 0）
+
+def configure_timeout_pool(concurrency: int) -> None:
+    """
+    按调用方的并发线程数设定超时线程池大小；已建好的池比需要的小时换一个更大的。
+    旧池只 shutdown(wait=False)：不再接新任务，但已提交的调用（包括超时后被放弃、仍在跑的）
+    照常在旧池的线程里跑完，线程随后退出；调用方不等它们。
+    """
+    global _TIMEOUT_POOL, _TIMEOUT_POOL_SIZE, _TIMEOUT_POOL_WORKERS
+    size = _TIMEOUT_POOL_ENV or 2 * max(1, int(concurrency))
+    with _TIMEOUT_POOL_LOCK:
+        _TIMEOUT_POOL_SIZE = size
+        if _TIMEOUT_POOL is not None and _TIMEOUT_POOL_WORKERS < size:
+            old, _TIMEOUT_POOL, _TIMEOUT_POOL_WORKERS = _TIMEOUT_POOL, None, 0
+            old.shutdown(wait=False)
+
+def _timeout_pool() -> ThreadPoolExecutor:
+    global _TIMEOUT_POOL, _TIMEOUT_POOL_WORKERS
+    with _TIMEOUT_POOL_LOCK:
+        if _TIMEOUT_POOL is None:
+            _TIMEOUT_POOL = ThreadPoolExecutor(max_workers=_TIMEOUT_POOL_SIZE, thread_name_prefix="llm-timeout")
+            _TIMEOUT_POOL_WORKERS = _TIMEOUT_POOL_SIZE
+        return _TIMEOUT_POOL
+
 def _run_with_timeout(desc: str, timeout_s: int, func):
-    step = 0.2
-    bar = tqdm(total=timeout_s, desc=desc, unit="s", position=2, leave=False)
-    stop = {"v": False}
-    def ticker():
-        import time as _t
-        t = 0.0
-        while not stop["v"] and t < timeout_s:
-            _t.sleep(step); t += step
-            try: bar.update(step)
-            except Exception: break
-        try: bar.close()
-        except Exception: pass
-    th = threading.Thread(target=ticker, daemon=True); th.start()
+    # 不再起 ticker 线程每 0.2s 刷一次进度条；结束时一次性把实际耗时写进 bar
+    t0 = time.monotonic()
+    bar = tqdm(total=timeout_s, desc=desc, unit="s", position=2, leave=False, mininterval=0.5)
+    fut = _timeout_pool().submit(func)
     try:
-        with ThreadPoolExecutor(max_workers=1) as ex:
-            fut = ex.submit(func)
-            return fut.result(timeout=timeout_s)
+        return fut.result(timeout=timeout_s)
     except FTimeout:
+        fut.cancel()   # 还没开始跑就取消；已在跑的只能等它自己结束（LLMClient 有 read_timeout 兜底）
         raise TimeoutError(f"{desc} timed out after {timeout_s}s")
     finally:
-        stop["v"] = True
-        try: bar.close()
+        try:
+            bar.update(min(float(timeout_s), time.monotonic() - t0))
+            bar.close()
         except Exception: pass
@@ -1,6 +1,8 @@
 
 # -*- coding: utf-8 -*-
-import re
+import re, os, hashlib, multiprocessing, threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from typing import List, Dict, Any
 import re as _re
 
@@ -98,46 +100,114 @@ def _first_match(rx, lines):
             return m
     return None
 
-def _collect_calltrace(lines):
+def _scan_lines(lines):
+    """
+    一次遍历同时拿到 BUG 标题 / Read-Write 行 / CPU 行的首个匹配和 Call Trace 帧，
+    三者都找到且 Call Trace 段已结束时提前退出。
+    """
+    title = rw = cpu = None
     frames = []
-    in_ct = False
+    ct_state = 0        # 0: 还没遇到 Call Trace:；1: 段内；2: 段已结束
     for ln in lines:
-        if _CALLTRACE_HDR.search(ln):
-            in_ct = True
-            continue
-        if in_ct:
-            if not ln.strip():
-                break
-            if _FRAME_RX.search(ln):
-                frames.append(ln.strip())
-            else:
-                if ln.strip().endswith(":"):
-                    break
-    return frames
-
-def _guess_bug_class(lines):
-    text = "\n".join(lines)
-    for name, rx in _BUG_CLASSES:
-        if rx.search(text):
-            return name
-    return "unknown"
+        if title is None:
+            title = _BUG_TITLE_RX.search(ln)
+        if rw is None:
+            rw = _RW_LINE_RX.search(ln)
+        if cpu is None:
+            cpu = _CPU_LINE_RX.search(ln)
+        if ct_state != 2:
+            if _CALLTRACE_HDR.search(ln):
+                ct_state = 1
+            elif ct_state == 1:
+                st = ln.strip()
+                if not st:
+                    ct_state = 2
+                elif _FRAME_RX.search(ln):
+                    frames.append(st)
+                elif st.endswith(":"):
+                    ct_state = 2
+        elif title is not None and rw is not None and cpu is not None:
+            break
+    return title, rw, cpu, frames
 
-def _guess_subsystem(lines):
-    text = "\n".join(lines)
-    for name, rx in _SUBSYS_HINTS:
+def _collect_calltrace(lines):
+    return _scan_lines(lines)[3]
+
+def _first_class(rx_list, text):
+    for name, rx in rx_list:
         if rx.search(text):
             return name
     return "unknown"
 
 def parse_core_facts_from_report(text: str) -> dict:
-    lines = [ln.rstrip("\n") for ln in text.splitlines()]
-    bug_title   = _first_match(_BUG_TITLE_RX, lines)
-    rw_info     = _first_match(_RW_LINE_RX, lines)
-    cpu_line    = _first_match(_CPU_LINE_RX, lines)
-    frames      = _collect_calltrace(lines)
+    # 结果只依赖 text：同一份报告多次诊断时复用；返回副本，调用方改动不会污染缓存
+    return dict(_parse_core_facts(text))
+
+# 总字符数达到该阈值才开进程池（进程启动 + 传参的开销对小批量不划算）
+_PARALLEL_MIN_CHARS = int(os.environ.get("LOGAGENTS_DIAGNOSE_PARALLEL_CHARS", "2000000"))
+
+# 批量解析用的进程池：整次运行共用一个，首次需要时创建（spawn 启动 + 导入只付一次），
+# 由调用方在结束时 shutdown_parse_pool()
+_PARSE_POOL = None
+_PARSE_POOL_LOCK = threading.Lock()
+
+def _parse_pool() -> ProcessPoolExecutor:
+    global _PARSE_POOL
+    with _PARSE_POOL_LOCK:
+        if _PARSE_POOL is None:
+            _PARSE_POOL = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1, mp_context=multiprocessing.get_context("spawn"))
+        return _PARSE_POOL
+
+def shutdown_parse_pool() -> None:
+    global _PARSE_POOL
+    with _PARSE_POOL_LOCK:
+        pool, _PARSE_POOL = _PARSE_POOL, None
+    if pool is not None:
+        pool.shutdown()
+
+# 磁盘缓存 key 里带上版本号：解析规则变了就改它，旧条目自然失效
+_FACTS_CACHE_VERSION = "1"
+
+def facts_cache_key(text: str) -> str:
+    h = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16)
+    h.update(_FACTS_CACHE_VERSION.encode())
+    return h.hexdigest()
+
+def parse_core_facts_batch(texts: List[str], cache=None) -> List[dict]:
+    """
+    批量版：相同的报告只解析一次，结果按输入顺序返回（每项都是独立的 dict）。
+    cache: 可选的 str -> dict 映射（如 shelve），按 facts_cache_key(text) 读写。
+    """
+    keys = list(dict.fromkeys(texts))
+    uniq = {}
+    if cache is not None:
+        hkeys = {t: facts_cache_key(t) for t in keys}
+        for t in keys:
+            hit = cache.get(hkeys[t])
+            if hit is not None:
+                uniq[t] = hit
+        todo = [t for t in keys if t not in uniq]
+    else:
+        todo = keys
+    if len(todo) > 1 and sum(map(len, todo)) >= _PARALLEL_MIN_CHARS:
+        facts = list(_parse_pool().map(_parse_core_facts, todo, chunksize=32))
+    else:
+        facts = [_parse_core_facts(t) for t in todo]
+    for t, f in zip(todo, facts):
+        uniq[t] = f
+        if cache is not None:
+            cache[hkeys[t]] = f
+    return [dict(uniq[t]) for t in texts]
+
+@lru_cache(maxsize=256)
+def _parse_core_facts(text: str) -> dict:
+    lines = text.splitlines()
+    bug_title, rw_info, cpu_line, frames = _scan_lines(lines)
     top_frame   = frames[0] if frames else ""
-    bug_class   = _guess_bug_class(lines)
-    subsystem   = _guess_subsystem(lines)
+    # 这些模式都不会跨越换行符匹配，直接搜原文与搜 "\n".join(lines) 结果一致，省掉 join
+    bug_class   = _first_class(_BUG_CLASSES, text)
+    subsystem   = _first_class(_SUBSYS_HINTS, text)
 
     func = None
     if bug_title:
@@ -165,8 +235,9 @@ def parse_core_facts_from_report(text: str) -> dict:
         "frame_count": len(frames),
     }
 
+@lru_cache(maxsize=256)
 def diagnose_crash_report(text: str) -> str:
-    f = parse_core_facts_from_report(text)
+    f = _parse_core_facts(text)
     bullets = []
 
     bc = f["bug_class"]
@@ -1,36 +1,130 @@
 
 # -*- coding: utf-8 -*-
-import re
-from typing import List, Dict
+import os, multiprocessing, threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Dict
 
-def rule_extract_fallback(logtxt: str, gid_list: List[str], gid2text: Dict[str, str]) -> Dict[str, str]:
+_MEM_STATE = "Memory state around"
+_CT_HDR = "Call Trace:\n"
+
+def _find_kasan(s: str):
+    r"""等价于 re.search(r"BUG:\s*KASAN", s)：返回 (start, end) 或 None。"""
+    n = len(s)
+    i = s.find("BUG:")
+    while i != -1:
+        j = i + 4
+        while j < n and s[j].isspace():
+            j += 1
+        if s.startswith("KASAN", j):
+            return i, j + 5
+        i = s.find("BUG:", i + 1)
+    return None
+
+def _kasan_block(s: str) -> Optional[str]:
+    r"""
+    等价于原来的 BUG:\s*KASAN[^\n]*\n(?:.*\n){0,200}?(?:Memory state around[^\n]*\n(?:.*\n){0,200})?
+    惰性量词总是取 0 次，所以结果 = BUG 行；若紧接着就是 Memory state 行，再带上它及其后最多 200 行。
+    这里用 find 线性扫描，不再依赖正则回溯。
+    """
+    m = _find_kasan(s)
+    if m is None:
+        return None
+    start, end = m
+    nl = s.find("\n", end)
+    if nl == -1:
+        return None
+    end = nl + 1
+    if s.startswith(_MEM_STATE, end):
+        nl = s.find("\n", end + len(_MEM_STATE))
+        if nl != -1:
+            end = nl + 1
+            for _ in range(200):
+                nl = s.find("\n", end)
+                if nl == -1:
+                    break
+                end = nl + 1
+    return s[start:end]
+
+def _calltrace_block(s: str) -> Optional[str]:
+    r"""等价于 (Call Trace:\n(?:.+\n){1,120})：头之后连续的非空整行，至少 1 行、至多 120 行。"""
+    i = s.find(_CT_HDR)
+    while i != -1:
+        end = i + len(_CT_HDR)
+        cnt = 0
+        while cnt < 120:
+            nl = s.find("\n", end)
+            if nl == -1 or nl == end:
+                break
+            end = nl + 1
+            cnt += 1
+        if cnt:
+            return s[i:end]
+        i = s.find(_CT_HDR, i + 1)
+    return None
+
+def _extract_one(s: str):
+    """单个 gid 的规则抽取：返回 (kind, text)，kind ∈ {"kasan", "calltrace", None}。"""
+    block = _kasan_block(s)
+    if block is not None:
+        return "kasan", block.strip("\n")
+    block = _calltrace_block(s)
+    if block is not None:
+        return "calltrace", block.strip("\n")
+    return None, ""
+
+# 文本总量超过该阈值（字符数）且 gid 不止一个时才用进程池，小输入串行更快
+_PARALLEL_MIN_CHARS = int(os.environ.get("LOGAGENTS_FALLBACK_PARALLEL_CHARS", "2000000"))
+
+# 进程池整次运行共用一个，第一次走并行路径时才创建，由调用方结束时 shutdown_fallback_pool()；
+# spawn：调用方（pl_extract）此时还有 LLM 线程在跑，fork 不安全
+_FALLBACK_POOL = None
+_FALLBACK_POOL_LOCK = threading.Lock()
+
+def _fallback_pool() -> ProcessPoolExecutor:
+    global _FALLBACK_POOL
+    with _FALLBACK_POOL_LOCK:
+        if _FALLBACK_POOL is None:
+            _FALLBACK_POOL = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1, mp_context=multiprocessing.get_context("spawn"))
+        return _FALLBACK_POOL
+
+def shutdown_fallback_pool() -> None:
+    global _FALLBACK_POOL
+    with _FALLBACK_POOL_LOCK:
+        pool, _FALLBACK_POOL = _FALLBACK_POOL, None
+    if pool is not None:
+        pool.shutdown()
+
+def _extract_all(texts: List[str]):
+    if len(texts) > 1 and sum(map(len, texts)) >= _PARALLEL_MIN_CHARS:
+        return list(_fallback_pool().map(_extract_one, texts))
+    return [_extract_one(s) for s in texts]
+
+def rule_extract_precompute(gid_list: List[str], gid2text: Dict[str, str]) -> Dict[str, tuple]:
+    """提前（不打印）算好各 gid 的规则抽取结果，真正走兜底时交给 rule_extract_fallback(precomputed=...)。"""
+    return dict(zip(gid_list, _extract_all([gid2text.get(gid, "") for gid in gid_list])))
+
+def rule_extract_fallback(logtxt: str, gid_list: List[str], gid2text: Dict[str, str],
+                          precomputed: Optional[Dict[str, tuple]] = None) -> Dict[str, str]:
     print(f"🚨 [FALLBACK] ===== RULE FALLBACK TRIGGERED =====")
     print(f"🚨 [FALLBACK] This means ALL LLM attempts failed!")
     print(f"🚨 [FALLBACK] Processing gids: {gid_list}")
     
     out = {}
-    for gid in gid_list:
-        s = gid2text.get(gid, "")
+    texts = [gid2text.get(gid, "") for gid in gid_list]
+    if precomputed is not None and all(gid in precomputed for gid in gid_list):
+        results = [precomputed[gid] for gid in gid_list]
+    else:
+        results = _extract_all(texts)
+    for gid, s, (kind, result) in zip(gid_list, texts, results):
         print(f"🚨 [FALLBACK] Processing {gid}, text length: {len(s)}")
-        
-        m = re.search(
-            r"(BUG:\s*KASAN[^\n]*\n(?:.*\n){0,200}?(?:Memory state around[^\n]*\n(?:.*\n){0,200})?)",
-            s, re.M
-        )
-        if m:
-            result = m.group(1).strip("\n")
+        if kind == "kasan":
             print(f"🚨 [FALLBACK] Found KASAN pattern, extracted {len(result)} chars")
-            out[gid] = result
-            continue
-            
-        m2 = re.search(r"(Call Trace:\n(?:.+\n){1,120})", s, re.M)
-        if m2:
-            result = m2.group(1).strip("\n")
+        elif kind == "calltrace":
             print(f"🚨 [FALLBACK] Found Call Trace pattern, extracted {len(result)} chars")
-            out[gid] = result
         else:
             print(f"🚨 [FALLBACK] No patterns found for {gid}")
-            out[gid] = ""
+        out[gid] = result
     
     print(f"🚨 [FALLBACK] ===== RULE FALLBACK END =====")
-    return out
\ No newline at end of file
+    return out
@@ -1,23 +1,43 @@
 
 # -*- coding: utf-8 -*-
 import os, json
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
 
-def read_jsonl(path: str) -> List[Dict[str, Any]]:
-    rows = []
-    with open(path, 'r', encoding='utf-8') as f:
+try:
+    import orjson
+except ImportError:  # falls back to the stdlib json module
+    orjson = None
+
+def _jsonl_line(r: Dict[str, Any]) -> bytes:
+    if orjson is not None:
+        # OPT_NON_STR_KEYS: 和 json.dumps 一样允许 int 等非 str 键
+        return orjson.dumps(r, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS)
+    return (json.dumps(r, ensure_ascii=False) + "\n").encode("utf-8")
+
+_loads = orjson.loads if orjson is not None else json.loads
+
+def read_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """逐行 yield，不把整个文件读成 list；二进制读取，orjson 直接解析 bytes。"""
+    with open(path, 'rb') as f:
         for ln in f:
             ln = ln.strip()
             if not ln:
                 continue
-            rows.append(json.loads(ln))
-    return rows
+            yield _loads(ln)
+
+def read_jsonl_list(path: str) -> List[Dict[str, Any]]:
+    """需要 len()/多次遍历时用。"""
+    return list(read_jsonl(path))
 
 def write_jsonl(rows: List[Dict[str, Any]], path: str) -> None:
     os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, 'w', encoding='utf-8') as f:
-        for r in rows:
-            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    with open(path, 'wb', buffering=1 << 20) as f:
+        f.writelines(_jsonl_line(r) for r in rows)
+
+def append_jsonl(f, r: Dict[str, Any]) -> None:
+    """往已打开的二进制文件追加一行并 flush：逐条落盘，中途崩溃也保留已写出的行。"""
+    f.write(_jsonl_line(r))
+    f.flush()
 
 def read_config(default_path="config.json") -> Dict[str, Any]:
     if os.path.exists(default_path):
@@ -7,15 +7,35 @@ v2025-08-19e:
   • Do NOT output "Kernel panic ..." and "Kernel Offset ...".
 """
 
-import re
+import os, re, logging
+from functools import lru_cache
 from typing import Dict, List, Tuple
+from ._ordering_impl import block_end, find_task_end
 
-print("[ORDER] ordering_ct_hoist.py v2025-08-19e is active")
+try:
+    import re2 as _re2   # optional: google-re2 / pyre2 (DFA, no backtracking)
+except ImportError:
+    _re2 = None
+
+logging.getLogger(__name__).info("[ORDER] ordering_ct_hoist.py v2025-08-19e is active")
 
 _WS_MULTI  = re.compile(r"\s+")
 _TS_PREFIX = re.compile(r"^\s*(\[[^\]]+\]\s*){1,2}")
+
+@lru_cache(maxsize=4096)
 def _normalize_for_match(s: str) -> str:
-    return _WS_MULTI.sub(" ", _TS_PREFIX.sub("", s)).strip()
+    # Same result as _WS_MULTI.sub(" ", _TS_PREFIX.sub("", s)).strip(), without the
+    # regex engine: drop up to two leading "[...]" groups, then split/join collapses
+    # whitespace.  Cached: the same line is normalized by dedupe, scoring and _is_frame.
+    y = s.lstrip()
+    for _ in range(2):
+        if y[:1] != "[":
+            break
+        k = y.find("]", 1)
+        if k <= 1:
+            break
+        y = y[k + 1:].lstrip()
+    return " ".join(y.split())
 
 # ---------- headers/markers ----------
 R_BUG    = re.compile(r"^.*BUG:\s*KASAN.*$", re.I)
@@ -40,9 +60,85 @@ R_REGS   = re.compile(r"^(RSP|RAX|RBX|RCX|RDX|RSI|RDI|RBP|R08|R09|R10|R11|R12|R1
 R_OFFS   = re.compile(r"^Kernel Offset:\s*", re.I)          # hard break only
 R_REBOOT = re.compile(r"^Rebooting in \d+ seconds\.\.", re.I)
 
+# One anchored alternation over every marker; branch order == the bucketing cascade
+# in order_normalize (first match wins), markers that the cascade does not bucket
+# come last.  _classify(s) -> label, or None for ordinary lines.
+_LABELED = [
+    ("BUG", R_BUG), ("RW", R_RW), ("CPU", R_CPU), ("HW", R_HW),
+    ("ALLOC", R_ALLOC), ("FREED", R_FREED), ("BUGGY", R_BUGGY), ("MEM", R_MEM), ("PAGE", R_PAGE),
+    ("RIP", R_RIP), ("CODE", R_CODE), ("REGS", R_REGS), ("REBOOT", R_REBOOT),
+    ("CT", R_CT), ("T_OPEN", R_T_OPEN), ("T_END", R_T_END), ("PANIC", R_PANIC), ("OFFS", R_OFFS),
+]
+_LINE_CLASSIFIER = re.compile("|".join(f"(?P<{k}>{rx.pattern})" for k, rx in _LABELED), re.I)
+# lines that end the frame run inside a Call Trace block
+_CT_STOP = re.compile("|".join(f"(?:{rx.pattern})" for rx in
+                               (R_ALLOC, R_FREED, R_BUGGY, R_MEM, R_PAGE, R_PANIC, R_OFFS, R_REBOOT)), re.I)
+
 # Hard-breakers: used to terminate CT or blocks, but not necessarily emitted.
-_HARD = [R_BUG, R_RW, R_CPU, R_HW, R_CT, R_ALLOC, R_FREED, R_BUGGY, R_MEM, R_PAGE,
-         R_PANIC, R_RIP, R_CODE, R_OFFS, R_REBOOT, R_T_OPEN, R_T_END]
+# Every label except REGS (register lines continue a RIP/Code: block).
+_HARD_LABELS = frozenset(k for k, _ in _LABELED if k != "REGS")
+
+# Fail-fast dispatch: only BUG/RW can match past the start of a line, every other branch
+# is anchored on one of these (lowercased) first characters.  For ASCII lines re.I is
+# plain lower-casing, so the branches a line can possibly match are known up front.
+_HEADS = {
+    "CPU": "c", "HW": "h", "ALLOC": "a", "FREED": "f", "BUGGY": "t", "MEM": "m", "PAGE": "p",
+    "RIP": "r", "CODE": "c", "REGS": "r", "REBOOT": "r",
+    "CT": "c", "T_OPEN": "<", "T_END": "<", "PANIC": "kp", "OFFS": "k",
+}
+_ANCHOR_HEADS = frozenset("".join(_HEADS.values()))
+
+# Optional RE2 build of the classifier (opt-in: LOGAGENTS_USE_RE2=1).  RE2 guarantees
+# linear-time matching, but on typical short log lines its per-call overhead makes it
+# slower than stock re, so it only pays off for pathological inputs.  Used for ASCII
+# lines only: there \s / \d / \b / case folding mean the same in both engines once \s
+# is spelled out (RE2's \s lacks \v and \x1c-\x1f).  Non-ASCII lines always use re.
+def _build_re2_classifier():
+    if _re2 is None or os.environ.get("LOGAGENTS_USE_RE2", "0") != "1":
+        return None
+    ws = r"[\t\n\x0b\x0c\r \x1c-\x1f]"
+    pat = "(?i)" + "|".join(f"(?P<{k}>{rx.pattern.replace(chr(92) + 's', ws)})" for k, rx in _LABELED)
+    try:
+        rx = _re2.compile(pat)
+        # bindings differ in Match API coverage: verify what _classify relies on
+        if rx.match("Call Trace:").lastgroup != "CT" or rx.match("foo") is not None:
+            return None
+    except Exception:
+        return None
+    return rx
+
+_ASCII_CLASSIFIER = _build_re2_classifier()
+_USE_RE2 = _ASCII_CLASSIFIER is not None
+if not _USE_RE2:
+    _ASCII_CLASSIFIER = _LINE_CLASSIFIER
+
+@lru_cache(maxsize=None)
+def _dispatch(head: str, bug: bool, rw: bool):
+    """
+    Sub-classifier for ASCII lines with first (lowercased) char `head`; BUG/RW branches
+    only when the line contains "bug:" / " of size ".  Branch order follows _LABELED,
+    so the first match is the same as with the full classifier.  None: cannot match.
+    """
+    parts = [(k, rx) for k, rx in _LABELED
+             if (bug if k == "BUG" else rw if k == "RW" else head in _HEADS[k])]
+    if not parts:
+        return None
+    if _USE_RE2:
+        return _ASCII_CLASSIFIER
+    return re.compile("|".join(f"(?P<{k}>{rx.pattern})" for k, rx in parts), re.I)
+
+def _classify(s: str):
+    if s.isascii():
+        low = s.lower()
+        h = low[:1]
+        # 非段头首字符一律映射到同一个哨兵（不在任何 _HEADS 里），只剩 BUG/RW 两个分支可试
+        rx = _dispatch(h if h in _ANCHOR_HEADS else "\0", "bug:" in low, " of size " in low)
+        if rx is None:
+            return None
+        m = rx.match(s)
+    else:
+        m = _LINE_CLASSIFIER.match(s)
+    return m.lastgroup if m else None
 
 ORDER = (
     "BUG", "RW", "CPU", "HW",
@@ -59,27 +155,34 @@ ORDER = (
 R_FRAME_STD   = re.compile(r"^[ \t]*[A-Za-z_.$<>][A-Za-z0-9_.$<>-]*\+0x[0-9a-fA-F]+/[0-9xa-fA-F]+(?:\b.*)?$")
 R_FRAME_HINT  = re.compile(r"^[ \t]*(?:__sys_|__x64_sys_|do_syscall_|entry_SYSCALL_|dump_stack|ret_from_|end_report|check_|kasan_).*$")
 
+_FRAME_HINT_PREFIXES = ("__sys_", "__x64_sys_", "do_syscall_", "entry_SYSCALL_", "dump_stack",
+                        "ret_from_", "end_report", "check_", "kasan_")
+
+@lru_cache(maxsize=4096)
 def _is_frame(line: str) -> bool:
     s = _normalize_for_match(line)
     if not s: return False
     c = s[0]
     if not (c.isalpha() or c in "_<"):
         return False
-    return bool(R_FRAME_STD.match(s) or R_FRAME_HINT.match(s))
+    # s is normalized (no leading/trailing whitespace, no line breaks), so R_FRAME_HINT
+    # is exactly a prefix test, and R_FRAME_STD can only match if "+0x" occurs at all
+    if s.startswith(_FRAME_HINT_PREFIXES):
+        return True
+    return "+0x" in s and R_FRAME_STD.match(s) is not None
 
 def _is_hard_break(s: str) -> bool:
-    for rx in _HARD:
-        if rx.match(s):
-            return True
-    return False
+    return _classify(s) in _HARD_LABELS
+
+def _first_seen(keys: List[str]) -> List[int]:
+    """Ascending indices of the first occurrence of each key (dict built in C, no per-item bytecode)."""
+    n = len(keys)
+    first = dict(zip(reversed(keys), range(n - 1, -1, -1)))   # later dupes overwritten by earlier index
+    return sorted(first.values())
 
 def _dedupe(lines: List[str]) -> List[str]:
-    seen=set(); out=[]
-    for ln in lines:
-        k = _normalize_for_match(ln)
-        if k in seen: continue
-        seen.add(k); out.append(ln)
-    return out
+    keys = list(map(_normalize_for_match, lines))
+    return [lines[i] for i in _first_seen(keys)]
 
 def _score_cpu(s: str) -> Tuple[int, int]:
     t = s.lower()
@@ -112,17 +215,20 @@ def _collect_regs_tail(lines, j, n):
             emit.append(j); j += 1
     return emit, j
 
-def _find_ct_blocks_with_hoist(lines: List[str], max_scan: int = 400):
+def _find_ct_blocks_with_hoist(lines: List[str], max_scan: int = 400, labels=None):
     """
     Build CT blocks:
       Call Trace: [<TASK>] frames... [RIP] [Code:] [REGS...] [</TASK (hoisted if found later)>]
     Exclude diagnostics. PANIC/OFFSET are hard breaks only.
+    labels: optional precomputed _classify() result per line.
     """
     n = len(lines)
+    if labels is None:
+        labels = [_classify(ln) for ln in lines]
     i = 0
     blocks = []
     while i < n:
-        if not R_CT.match(lines[i]):
+        if labels[i] != "CT":
             i += 1; continue
 
         used = set()
@@ -133,7 +239,7 @@ def _find_ct_blocks_with_hoist(lines: List[str], max_scan: int = 400):
         j = i + 1
 
         # optional immediate <TASK>
-        if j < n and R_T_OPEN.match(lines[j]):
+        if j < n and labels[j] == "T_OPEN":
             emit.append(j); used.add(j); j += 1
 
         # frames until blank or diagnostics/hard breaks (panic/offset etc. stop frames as well)
@@ -141,7 +247,7 @@ def _find_ct_blocks_with_hoist(lines: List[str], max_scan: int = 400):
             s = lines[j]
             if not s.strip():
                 break
-            if R_ALLOC.match(s) or R_FREED.match(s) or R_BUGGY.match(s) or R_MEM.match(s) or R_PAGE.match(s) or R_PANIC.match(s) or R_OFFS.match(s) or R_REBOOT.match(s):
+            if _CT_STOP.match(s):
                 break
             if _is_frame(s):
                 emit.append(j); used.add(j); j += 1; continue
@@ -154,17 +260,8 @@ def _find_ct_blocks_with_hoist(lines: List[str], max_scan: int = 400):
         j = j2
 
         # hoist a later </TASK> if exists within scan window
-        end_pos = None
-        scan_upto = min(n, i + 1 + max_scan)
-        k = j
-        while k < scan_upto:
-            if R_T_END.match(lines[k]):
-                end_pos = k
-                break
-            if R_CT.match(lines[k]):  # don't scan across another CT
-                break
-            k += 1
-        if end_pos is not None:
+        end_pos = find_task_end(labels, j, min(n, i + 1 + max_scan))
+        if end_pos >= 0:
             used.add(end_pos)
             emit.append(end_pos)
 
@@ -172,15 +269,23 @@ def _find_ct_blocks_with_hoist(lines: List[str], max_scan: int = 400):
         i = j + 1
     return blocks
 
+# _classify label -> how the bucketing pass handles the line
+_SINGLE_LINE = frozenset(("BUG", "RW", "CPU", "HW", "REBOOT"))
+_BLOCK_START = frozenset(("ALLOC", "FREED", "BUGGY", "MEM", "PAGE"))
+_REGS_START  = frozenset(("RIP", "CODE", "REGS"))
+
 def order_normalize(candidate_text: str) -> str:
     if not candidate_text:
         return ""
 
     raw = [ln.rstrip("\r") for ln in candidate_text.splitlines()]
     n = len(raw)
+    # classify every line once; CT detection, block collection and bucketing all reuse it
+    # (Call Trace:/<TASK>/</TASK> patterns are full-line and exclusive, so label == match)
+    labels = [_classify(ln) for ln in raw]
 
     # 1) CT blocks with safe hoist of </TASK>, including RIP/Code:/registers inside
-    ct_blocks = _find_ct_blocks_with_hoist(raw)
+    ct_blocks = _find_ct_blocks_with_hoist(raw, labels=labels)
 
     used = set()
     for b in ct_blocks:
@@ -200,15 +305,9 @@ def order_normalize(candidate_text: str) -> str:
             buckets["CALLTRACE"].append("")
         buckets["CALLTRACE"].extend([raw[idx] for idx in b['emit']])
 
-    def collect_block(start: int) -> int:
-        j = start
-        block = []
-        while j < n:
-            if j != start and _is_hard_break(raw[j]):
-                break
-            block.append(raw[j])
-            j += 1
-        return j, block
+    def collect_block(start: int):
+        j = block_end(labels, start, _HARD_LABELS)
+        return j, raw[start:j]
 
     i = 0
     while i < n:
@@ -216,32 +315,17 @@ def order_normalize(candidate_text: str) -> str:
             i += 1; continue
 
         s = raw[i]
-        if R_BUG.match(s):    add("BUG", i); i += 1; continue
-        if R_RW.match(s):     add("RW", i); i += 1; continue
-
-        if R_CPU.match(s):    add("CPU", i); i += 1; continue
-        if R_HW.match(s):     add("HW", i); i += 1; continue
-
-        if R_ALLOC.match(s):
-            j, blk = collect_block(i)
-            buckets["ALLOC"].extend(blk); used.update(range(i, j)); i = j; continue
-        if R_FREED.match(s):
-            j, blk = collect_block(i)
-            buckets["FREED"].extend(blk); used.update(range(i, j)); i = j; continue
-        if R_BUGGY.match(s):
-            j, blk = collect_block(i)
-            buckets["BUGGY"].extend(blk); used.update(range(i, j)); i = j; continue
-        if R_MEM.match(s):
+        label = labels[i]
+        if label in _SINGLE_LINE:
+            add(label, i); i += 1; continue
+        if label in _BLOCK_START:
             j, blk = collect_block(i)
-            buckets["MEM"].extend(blk); used.update(range(i, j)); i = j; continue
-        if R_PAGE.match(s):
-            j, blk = collect_block(i)
-            buckets["PAGE"].extend(blk); used.update(range(i, j)); i = j; continue
+            buckets[label].extend(blk); used.update(range(i, j)); i = j; continue
 
         # PANIC: intentionally skipped (never output)
         # OFFSET: intentionally skipped (never output)
 
-        if R_RIP.match(s) or R_CODE.match(s) or R_REGS.match(s):
+        if label in _REGS_START:
             j, blk = collect_block(i)
             for ln in blk:
                 if R_RIP.match(ln) or R_CODE.match(ln):
@@ -250,63 +334,33 @@ def order_normalize(candidate_text: str) -> str:
                     buckets["REGS"].append(ln)
             used.update(range(i, j)); i = j; continue
 
-        if R_REBOOT.match(s):
-            add("REBOOT", i); i += 1; continue
-
         # drop stray frames outside CT
         if _is_frame(s):
             used.add(i); i += 1; continue
 
         buckets["_OTHER"].append(raw[i]); used.add(i); i += 1
 
-    # 3) Emit in canonical order; dedupe block-wise; pick best CPU/HW
+    # 3) Emit in canonical order; dedupe block-wise; pick best CPU/HW.
+    #    Fused with the final tidy (no <TASK>/</TASK> outside CALLTRACE) and blank
+    #    compression: only non-blank lines are kept, blocks are separated by one "".
     out: List[str] = []
-    def emit_block(lines: List[str]):
-        lines = [x for x in lines if x.strip() != ""]
-        lines = _dedupe(lines)
-        if not lines: return
-        if out and out[-1] != "":
-            out.append("")
-        out.extend(lines)
-
+    in_ct = False
     for key in ORDER:
         arr = buckets.get(key, [])
         if not arr: continue
-        if key == "CPU":
-            emit_block(_pick_best(arr, "CPU"))
-        elif key == "HW":
-            emit_block(_pick_best(arr, "HW"))
-        else:
-            emit_block(arr)
-
-    # 4) Final tidy: ensure no <TASK> or </TASK> appear outside CALLTRACE
-    final = []
-    in_ct = False
-    for ln in out:
-        if R_CT.match(ln):
-            in_ct = True
-            final.append(ln); continue
-        if in_ct:
-            final.append(ln)
-            if R_T_END.match(ln):
-                in_ct = False
-        else:
-            if R_T_OPEN.match(ln) or R_T_END.match(ln):
+        if key == "CPU" or key == "HW":
+            arr = _pick_best(arr, key)
+        sep = bool(out)
+        for ln in _dedupe([x for x in arr if x.strip() != ""]):
+            if in_ct:
+                if R_T_END.match(ln):
+                    in_ct = False
+            elif R_CT.match(ln):
+                in_ct = True
+            elif R_T_OPEN.match(ln) or R_T_END.match(ln):
                 continue
-            final.append(ln)
-
-    # compress blank lines
-    cleaned = []
-    prev_blank = False
-    for ln in final:
-        if ln.strip():
-            cleaned.append(ln); prev_blank = False
-        else:
-            if not prev_blank and cleaned:
-                cleaned.append("")
-            prev_blank = True
-
-    while cleaned and cleaned[0] == "": cleaned.pop(0)
-    while cleaned and cleaned[-1] == "": cleaned.pop()
-
-    return "\n".join(cleaned)
+            if sep:
+                out.append(""); sep = False
+            out.append(ln)
+
+    return "\n".join(out)
@@ -1,11 +1,14 @@
 
 # -*- coding: utf-8 -*-
-import re
+import re, logging
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import List, Dict
 from .sections import SECTION_ORDER
-from .ordering import _normalize_for_match as _norm
-from .ordering import _TS_PREFIX, _WS_MULTI
+from .ordering import _normalize_for_match as _norm, _first_seen
+from .ordering import _TS_PREFIX
+
+log = logging.getLogger(__name__)
 
 REPORT_IGNORES = [
     re.compile(r"^Kernel panic - not syncing", re.I),
@@ -31,39 +34,67 @@ _RX = {
 }
 
 def _compact_blank_lines(lines: List[str]) -> List[str]:
+    # 一遍完成：开头的空行不输出，连续空行压成一个 ""，末尾至多剩一个 "" 再去掉
     out = []
     blank = False
     for ln in lines:
         if _RX["BLANK"].match(ln):
-            if not blank:
+            if not blank and out:
                 out.append("")
             blank = True
         else:
             out.append(ln); blank = False
-    while out and _RX["BLANK"].match(out[0]): out.pop(0)
-    while out and _RX["BLANK"].match(out[-1]): out.pop()
+    if out and out[-1] == "": out.pop()
     return out
 
+# 锚定在行首的纯字面量段头（互不重叠），ASCII 行直接用 startswith 判断
+_PREFIX_TABLE = (
+    ("cpu:", "CPU"), ("hardware name:", "HW"), ("call trace:", "CALL"),
+    ("allocated by task", "ALLOC"), ("freed by task", "FREED"),
+    ("the buggy address belongs to", "BUGGY"), ("memory state around", "MEM"),
+)
+
+def _match_section(n: str):
+    """SECTION_ORDER 中第一个命中的段名（与逐个 _RX[k].search(n) 结果一致）。"""
+    if not n.isascii():
+        for k in SECTION_ORDER:
+            if _RX[k].search(n):
+                return k
+        return None
+    # ASCII 下 re.I 就是 lower()：先用子串/前缀快速排除，最后才跑正则
+    low = n.lower()
+    if "bug:" in low and _RX["BUG"].search(n):
+        return "BUG"
+    if " of size " in low and _RX["RW"].search(n):
+        return "RW"
+    for pfx, k in _PREFIX_TABLE:
+        if low.startswith(pfx):
+            return k
+    return "DIAG" if _RX["DIAG"].search(n) else None
+
+# 逐行分类而不是整篇 finditer：匹配基于 _norm 后的行（去时间戳、压缩空白），且同一行按
+# SECTION_ORDER 优先级取第一个命中的段（不是行内最左）。整篇扫描既不能直接作用在原文上
+# （要先逐行 _norm），命中后还得逐行再判一次优先级，省不掉这趟逐行循环。
 def _split_into_buckets(text: str) -> Dict[str, List[str]]:
     buckets = {k: [] for k in SECTION_ORDER}
     current = None
     for ln in (text or "").splitlines():
         n = _norm(ln)
-        matched = None
-        for k in SECTION_ORDER:
-            if _RX[k].search(n):
-                matched = k
-                break
+        matched = _match_section(n)
         if matched:
             current = matched; buckets[current].append(ln)
         else:
             if current: buckets[current].append(ln)
     return buckets
 
+@lru_cache(maxsize=32)
+def _compile_tool_rx(tool_rx: str):
+    return re.compile(tool_rx, re.I)
+
 def _trim_call_trace(call_lines: List[str], tool_rx: str, max_frames: int) -> List[str]:
     if not call_lines:
         return []
-    tool = re.compile(tool_rx, re.I)
+    tool = _compile_tool_rx(tool_rx)
     out = []; started = False
     for i, ln in enumerate(call_lines):
         if i == 0:
@@ -113,11 +144,8 @@ def _collect_diag_blocks(diag_lines: List[str]) -> List[List[str]]:
 def _dedupe_diag_blocks(blocks):
     seen=set(); kept=[]
     def key_of(blk):
-        ks=[]
-        for ln in blk[:2]:
-            n=_norm(ln)
-            if n: ks.append(n)
-        return "\n".join(ks)
+        # tuple 直接做 key，省掉拼接字符串（_norm 结果不含换行，与原 "\n".join 区分能力相同）
+        return tuple(n for n in map(_norm, blk[:2]) if n)
     for blk in blocks:
         k=key_of(blk)
         if k and k not in seen:
@@ -150,6 +178,10 @@ class SyzPolicy:
     forbid_question_mark: bool = True
 
 
+def _collapse_ws(s: str) -> str:
+    # == _WS_MULTI.sub(" ", s).strip()：str.split() 与 \s 用同一套空白字符
+    return " ".join(s.split())
+
 def split_into_buckets(text: str):
     return _split_into_buckets(text)
 
@@ -162,43 +194,22 @@ def apply_syzbot_policy(text: str, policy: SyzPolicy) -> str:
         if '?' not in cleaned_line and '？' not in cleaned_line:
             cleaned_lines.append(cleaned_line)
         else:
-            print(f"[POLICY] 过滤掉问号行: {line}")
+            log.debug("[POLICY] 过滤掉问号行: %s", line)
     
     # 添加去重逻辑
-    def _normalize_for_match(s: str) -> str:
-        return _WS_MULTI.sub(" ", s).strip()
-    
-    seen = set()
-    dedup_lines = []
-    for ln in cleaned_lines:
-        if not ln.strip():
-            continue
-        n = _normalize_for_match(ln)
-        if n in seen:
-            print(f"[POLICY] 去重跳过: {ln}")
-            continue
-        seen.add(n)
-        dedup_lines.append(ln)
-    
-    # 压缩空行
-    final_lines = []
-    prev_blank = False
-    for ln in dedup_lines:
-        if not ln.strip():
-            if not prev_blank:
-                final_lines.append("")
-            prev_blank = True
-        else:
-            final_lines.append(ln)
-            prev_blank = False
+    nonblank = [ln for ln in cleaned_lines if ln.strip()]
+    kept = _first_seen(list(map(_collapse_ws, nonblank)))
+    dedup_lines = [nonblank[i] for i in kept]
+    if len(kept) != len(nonblank) and log.isEnabledFor(logging.DEBUG):
+        kept_set = set(kept)
+        for i, ln in enumerate(nonblank):
+            if i not in kept_set:
+                log.debug("[POLICY] 去重跳过: %s", ln)
     
-    # 去除首尾空行
-    while final_lines and not final_lines[0].strip():
-        final_lines.pop(0)
-    while final_lines and not final_lines[-1].strip():
-        final_lines.pop()
+    # dedup_lines 只含非空行：不会有要压缩的空行，也没有首尾空行要去
+    final_lines = dedup_lines
     
     filtered_text = "\n".join(final_lines)
-    print(f"[POLICY] 最终输出: {len(final_lines)} 行")
+    log.info("[POLICY] 最终输出: %d 行", len(final_lines))
     
     return filtered_text
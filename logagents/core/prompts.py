@@ -1,6 +1,6 @@
 # # -*- coding: utf-8 -*-
 import re
-from typing import List, Dict
+from typing import List, Dict, Tuple
 
 SYZBOT_RULES = """You are extracting a syzbot-style crash report from a Linux kernel log.
 STRICT RULES:
@@ -40,7 +40,41 @@ STRICT RULES:
 FEWSHOT_FULL  = None
 FEWSHOT_LIGHT = None
 
-def build_fx_fz_prompts(gids: List[str], gid2text: Dict[str, str], tok_budget: int, max_lines: int, stride: int, fewshots=None) -> str:
+# 单个 chunk 的提示块，占位符 {gid} / {txt}
+BLOCK_TEMPLATE = (
+    "### INPUT CHUNK {gid} START\n"
+    "{txt}\n"
+    "### INPUT CHUNK {gid} END\n"
+    "要求：从该 chunk 中，抽取 syzbot 风格报告的所有【在本 chunk 内出现的】段落，并严格逐行拷贝原文子串（允许去掉开头形如\"[ 12.345]\"的时间戳）。\n"
+    "⚠️ 特别注意：\n"
+    "- 函数调用行必须完整保留，包括偏移量、源文件路径、行号以及 [inline] 标记（例如：do_check_common+0x13f/0x20b0 kernel/bpf/verifier.c:22798 [inline]）。绝不能截断或省略任何部分。\n"
+    "- 不要只保留函数名；必须逐字输出整行。\n"
+    "- 除去时间戳外，任何字符都不能删除或改写。\n"
+    "\n"
+    "可抽取的段包括：\n"
+    "1) 以 'BUG: KASAN:' 开头的行（若本 chunk 不含则跳过）\n"
+    "2) 'Read of size N...' 或 'Write of size N...'（若不含则跳过）\n"
+    "3) 'CPU:'（以及可选的 'Hardware name:'）（若不含则跳过）\n"
+    "4) 'Call Trace:' 起始到若干栈帧：\n"
+    "   - 保留所有栈帧行，逐字拷贝。\n"
+    "   - 跳过 dump_stack/kasan_report/__asan_/printk 等工具帧。\n"
+    "   - 其余函数调用行必须完整逐字输出，包括路径、行号、[inline]。\n"
+    "5) 如出现以下任何 KASAN 详情或诊断块请完整拷贝：\n"
+    "   5.1) 'Allocated by task' 块；5.2) 'Freed by task'；5.3) 'The buggy address belongs to'；5.4) 'Memory state around'（含后续十六进制字节块）\n"
+    "   5.5) 'page_owner' / 以 'page:' 开头的 page dump；'slab/object/kmalloc/kmem_cache' 相关块；'Disassembly/Code:'；'ftrace/tracing'；寄存器组（RIP/RSP/RAX...）\n"
+    "\n"
+    "只输出原文行，不添加注释/JSON/标签/多余标点。\n"
+    "重要：如果任何行包含问号（'?' 或 '？'），请跳过该行不要输出。\n"
+    "### CHUNK {gid} START\n"
+    "...拷贝的原文行...\n"
+    "### CHUNK {gid} END\n"
+)
+
+def _fewshot_header(fewshots) -> str:
+    return f"### FEWSHOT ###\n{fewshots}\n### END FEWSHOT ###\n" if fewshots else ""
+
+def build_fx_fz_prompt_parts(gids: List[str], gid2text: Dict[str, str], tok_budget: int, max_lines: int, stride: int, fewshots=None) -> Tuple[str, str]:
+    """(静态前缀, 动态部分)：前缀只取决于 fewshots，跨任务不变；动态部分是各 chunk 的日志块。"""
     remain = max(tok_budget, 200) * 4  # rough char budget
     blocks = []
     for gid in gids:
@@ -48,50 +82,42 @@ def build_fx_fz_prompts(gids: List[str], gid2text: Dict[str, str], tok_budget: i
         if len(txt) > remain:
             txt = txt[:remain]
         remain = max(0, remain - len(txt))
-        block = (
-            f"### INPUT CHUNK {gid} START\n"
-            f"{txt}\n"
-            f"### INPUT CHUNK {gid} END\n"
-            f"要求：从该 chunk 中，抽取 syzbot 风格报告的所有【在本 chunk 内出现的】段落，并严格逐行拷贝原文子串（允许去掉开头形如\"[ 12.345]\"的时间戳）。\n"
-            f"⚠️ 特别注意：\n"
-            f"- 函数调用行必须完整保留，包括偏移量、源文件路径、行号以及 [inline] 标记（例如：do_check_common+0x13f/0x20b0 kernel/bpf/verifier.c:22798 [inline]）。绝不能截断或省略任何部分。\n"
-            f"- 不要只保留函数名；必须逐字输出整行。\n"
-            f"- 除去时间戳外，任何字符都不能删除或改写。\n"
-            f"\n"
-            f"可抽取的段包括：\n"
-            f"1) 以 'BUG: KASAN:' 开头的行（若本 chunk 不含则跳过）\n"
-            f"2) 'Read of size N...' 或 'Write of size N...'（若不含则跳过）\n"
-            f"3) 'CPU:'（以及可选的 'Hardware name:'）（若不含则跳过）\n"
-            f"4) 'Call Trace:' 起始到若干栈帧：\n"
-            f"   - 保留所有栈帧行，逐字拷贝。\n"
-            f"   - 跳过 dump_stack/kasan_report/__asan_/printk 等工具帧。\n"
-            f"   - 其余函数调用行必须完整逐字输出，包括路径、行号、[inline]。\n"
-            f"5) 如出现以下任何 KASAN 详情或诊断块请完整拷贝：\n"
-            f"   5.1) 'Allocated by task' 块；5.2) 'Freed by task'；5.3) 'The buggy address belongs to'；5.4) 'Memory state around'（含后续十六进制字节块）\n"
-            f"   5.5) 'page_owner' / 以 'page:' 开头的 page dump；'slab/object/kmalloc/kmem_cache' 相关块；'Disassembly/Code:'；'ftrace/tracing'；寄存器组（RIP/RSP/RAX...）\n"
-            f"\n"
-            f"只输出原文行，不添加注释/JSON/标签/多余标点。\n"
-            f"重要：如果任何行包含问号（'?' 或 '？'），请跳过该行不要输出。\n"
-            f"### CHUNK {gid} START\n"
-            f"...拷贝的原文行...\n"
-            f"### CHUNK {gid} END\n"
-        )
+        blocks.append(BLOCK_TEMPLATE.format(gid=gid, txt=txt))
+    return _fewshot_header(fewshots), "\n".join(blocks)
 
-        blocks.append(block)
-    header = ""
-    if fewshots:
-        header = f"### FEWSHOT ###\n{fewshots}\n### END FEWSHOT ###\n"
-    return header + "\n".join(blocks)
+def build_fx_fz_prompts(gids: List[str], gid2text: Dict[str, str], tok_budget: int, max_lines: int, stride: int, fewshots=None) -> str:
+    static, dynamic = build_fx_fz_prompt_parts(gids, gid2text, tok_budget, max_lines, stride, fewshots=fewshots)
+    return static + dynamic
+
+# 一次扫描拿到所有 "### CHUNK <gid> START ... END" 块（\1 反向引用保证首尾 gid 一致，re.I 下同样忽略大小写）
+_CHUNK_RX = re.compile(r"###\s*CHUNK\s*(\S+)\s*START\s*\n(.*?)\n###\s*CHUNK\s*\1\s*END", re.S | re.I)
+
+def _gid_lookup(gids: List[str]):
+    """块头里的 gid -> 与之相等（re.I 意义下，同 re.escape(gid) + re.I）的输入 gid 列表。"""
+    if all(g.isascii() for g in gids):
+        by_lower: Dict[str, List[str]] = {}
+        for gid in gids:
+            by_lower.setdefault(gid.lower(), []).append(gid)
+        # 全 ASCII：ASCII 的块头 gid 查 lower() 表即可；带非 ASCII 字符的（如 U+212A 对 k）逐个按 re.I 比较
+        return lambda g: by_lower.get(g.lower(), ()) if g.isascii() else [
+            gid for gid in gids if re.fullmatch(re.escape(gid), g, re.I)]
+    return lambda g: [gid for gid in gids if re.fullmatch(re.escape(gid), g, re.I)]
 
 def align_answer_to_chunks(output_text: str, gids: List[str]) -> Dict[str, str]:
     res = {gid: "" for gid in gids}
-    for gid in gids:
-        pattern = re.compile(
-            r"###\s*CHUNK\s*{}\s*START\s*\n(.*?)\n###\s*CHUNK\s*{}\s*END".format(
-                re.escape(gid), re.escape(gid)
-            ), re.S | re.I
-        )
-        m = pattern.search(output_text)
-        if m:
-            res[gid] = m.group(1).strip("\n")
+    lookup = _gid_lookup(gids)
+    found: Dict[str, str] = {}
+    search = _CHUNK_RX.search
+    pos = 0
+    # 每次从上一个块头的下一个字符继续找：嵌套在别的块里的块也能找到，
+    # 每个 gid 取最靠前的一块，和逐个 gid 搜索的结果一致
+    while len(found) < len(res):
+        m = search(output_text, pos)
+        if m is None:
+            break
+        for gid in lookup(m.group(1)):
+            found.setdefault(gid, m.group(2))
+        pos = m.start() + 1
+    for gid, body in found.items():
+        res[gid] = body.strip("\n")
     return res
@@ -1,6 +1,7 @@
 
 # -*- coding: utf-8 -*-
-import re
+import os, re
+from functools import lru_cache
 # _TS_PREFIX = re.compile(r"^\s*\[[^\]]+\]\s*")
 _TS_PREFIX = re.compile(r"^\s*(\[[^\]]+\]\s*){1,2}")
 
@@ -15,19 +16,36 @@ def _normalize_line(s: str) -> str:
 def _normalize_text_block(s: str) -> str:
     return "\n".join(_normalize_line(ln) for ln in s.splitlines())
 
+@lru_cache(maxsize=4)
+def _log_index(whole_log_text: str):
+    """
+    同一份日志会被每个 chunk 的 sanitize 反复使用：归一化全文和行集合只算一次。
+    返回 (原始行集合, 归一化全文, 归一化行集合)。
+    """
+    norm_whole = _normalize_text_block(whole_log_text)
+    return frozenset(whole_log_text.splitlines()), norm_whole, frozenset(norm_whole.split("\n"))
+
+# 部分行（LLM 截断/拼接）才需要对全文做子串扫描，O(len(log))/行；
+# 日志超过该长度（字符数）时只认整行（原样或归一化后）命中
+_SUBSTR_MAX_CHARS = int(os.environ.get("LOGAGENTS_SANITIZE_SUBSTR_MAX_CHARS", "262144"))
+
 def sanitize_from_log(extracted: str, whole_log_text: str, span: str = "full"):
     if not extracted:
         return []
     kept = []
-    norm_whole = _normalize_text_block(whole_log_text)
+    whole_lines, norm_whole, norm_lines = _log_index(whole_log_text)
+    substr = len(whole_log_text) <= _SUBSTR_MAX_CHARS
     for line in extracted.splitlines():
         s = line.strip("\r")
         if not s:
             continue
-        if s in whole_log_text:
+        # 整行命中（原样 / 归一化后）走集合 O(1)，先于任何子串扫描
+        if s in whole_lines:
             kept.append(s); continue
         ns = _normalize_line(s)
-        if ns and ns in norm_whole:
+        if ns and ns in norm_lines:
+            kept.append(s); continue
+        if substr and (s in whole_log_text or (ns and ns in norm_whole)):
             kept.append(s)
     return kept
 
@@ -19,33 +19,67 @@ SECTION_ORDER = ["BUG","RW","CPU","HW","CALL","ALLOC","FREED","BUGGY","MEM","DIA
 _HEX_DUMP  = re.compile(r"^(?:[0-9a-f]{2}\s+){8,}[0-9a-f]{2}\s*$", re.I)
 
 def _collect_block_from(lines: List[str], start_idx: int, max_len=120, stop_headers=None):
+    is_stop = (lambda k: any(hdr.search(lines[k]) for hdr in stop_headers)) if stop_headers else None
+    return _collect_block_until(lines, start_idx, max_len, is_stop)
+
+def _collect_block_until(lines: List[str], start_idx: int, max_len, is_stop):
     out = []
     n = len(lines); i = start_idx
     while i < n and len(out) < max_len:
         ln = lines[i].rstrip("\n")
         out.append(ln)
-        if stop_headers:
+        if is_stop is not None:
             if not _HEX_DUMP.match(ln):
-                nxt = (i+1 < n) and any(hdr.search(lines[i+1]) for hdr in stop_headers)
-                if nxt:
+                if i+1 < n and is_stop(i+1):
                     break
         i += 1
     return out
 
+# 每个段头的必要条件（小写字面量）：contains=任意位置出现，否则为行首前缀。
+# ASCII 行上 re.I 等价于 lower()，先过这一关再用原正则确认，大多数行一次都不进正则。
+_HEADER_GATES = {
+    "BUG":   (True,  "bug:"),
+    "RW":    (True,  " of size "),
+    "CPU":   (False, "cpu:"),
+    "HW":    (False, "hardware name:"),
+    "CALL":  (False, "call trace:"),
+    "ALLOC": (False, "allocated by task"),
+    "FREED": (False, "freed by task"),
+    "BUGGY": (False, "the buggy address belongs to"),
+    "MEM":   (False, "memory state around"),
+}
+_GATED_SPECS = [(name, pat) + _HEADER_GATES[name] for name, pat in SECTION_SPECS]
+
+def _header_names(ln: str) -> Tuple[str, ...]:
+    """按 SECTION_SPECS 顺序返回该行命中的段名（等价于逐个 pat.search(ln)）。"""
+    if not ln.isascii():
+        return tuple(name for name, pat in SECTION_SPECS if pat.search(ln))
+    low = ln.lower()
+    return tuple(name for name, pat, contains, lit in _GATED_SPECS
+                 if (lit in low if contains else low.startswith(lit)) and pat.search(ln))
+
 def extract_sections_from_log(lines: List[str]):
     found = {}
     n = len(lines)
-    for i, ln in enumerate(lines):
-        for name, pat in SECTION_SPECS:
+    names_at: List = [None] * n      # 每行的段头命中结果，按需计算、只算一次
+    def names(k):
+        v = names_at[k]
+        if v is None:
+            v = names_at[k] = _header_names(lines[k])
+        return v
+    for i in range(n):
+        if len(found) == len(SECTION_SPECS):
+            break
+        for name in names(i):
             if name in found:
                 continue
-            if pat.search(ln):
-                stop_headers = [p for _, p in SECTION_SPECS if _ != name]
-                if name == "CALL":
-                    block = _collect_block_from(lines, i, max_len=200, stop_headers=stop_headers)
-                elif name in ("MEM", "ALLOC", "FREED", "BUGGY"):
-                    block = _collect_block_from(lines, i, max_len=300, stop_headers=stop_headers)
-                else:
-                    block = _collect_block_from(lines, i, max_len=120, stop_headers=stop_headers)
-                found[name] = block
+            # stop at the next line that carries any *other* section header
+            is_stop = lambda k, _self=name: any(x != _self for x in names(k))
+            if name == "CALL":
+                block = _collect_block_until(lines, i, 200, is_stop)
+            elif name in ("MEM", "ALLOC", "FREED", "BUGGY"):
+                block = _collect_block_until(lines, i, 300, is_stop)
+            else:
+                block = _collect_block_until(lines, i, 120, is_stop)
+            found[name] = block
     return found
@@ -3,22 +3,36 @@ python -m logagents.pipelines.pl_diagnose --candidates ./out/full/candidates.jso
 """
 
 # -*- coding: utf-8 -*-
-import os, argparse
+import os, argparse, shelve
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from ..core.io_utils import read_jsonl, write_jsonl, read_config
-from ..core.diagnose import diagnose_crash_report, diagnose_crash_report_cot, parse_core_facts_from_report
+from ..core.diagnose import diagnose_crash_report, diagnose_crash_report_cot, parse_core_facts_batch, shutdown_parse_pool
+from ..core.chunking import configure_timeout_pool
 from llm_client import LLMClient
 from tqdm import tqdm
 
+# json 模式下每攒够这么多条就批量解析一次并写出（批内去重 / 并行，内存不随文件增长）
+_JSON_BATCH = 2048
+
+def _candidates(rows, pbar):
+    """过滤空 candidate，产出 (cid, ctext)；被跳过的记录也计入进度。"""
+    for r in rows:
+        ctext = r.get("candidate","")
+        if not ctext.strip():
+            pbar.update(1); continue
+        yield r.get("id"), ctext
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--candidates", required=True)
     ap.add_argument("--out", required=True)
     ap.add_argument("--mode", choices=["cot","rules"], default="cot")
     ap.add_argument("--format", choices=["json","md"], default="json")
+    ap.add_argument("--cache_dir", default=None)   # json 模式：按报告内容哈希缓存解析结果
     args = ap.parse_args()
     os.makedirs(args.out, exist_ok=True)
 
-    rows = read_jsonl(args.candidates)
+    rows = read_jsonl(args.candidates)   # 惰性迭代，不整体读入内存
     cfg = read_config("config.json")
     has_llm = (args.mode=="cot")
     if has_llm:
@@ -29,32 +43,73 @@ def main():
             timeout=int(cfg.get("LLM_TIMEOUT_DIAGNOSE", cfg.get("LLM_TIMEOUT", 90))),
             retries=int(cfg.get("LLM_RETRIES", 0)),
             connect_timeout=int(cfg.get("LLM_CONNECT_TIMEOUT", 10)),
-            read_timeout=int(cfg.get("LLM_READ_TIMEOUT", 55))
+            read_timeout=int(cfg.get("LLM_READ_TIMEOUT", 55)),
+            pool_size=int(cfg.get("LLM_CONCURRENCY", 2))   # 每个工作线程一条 keep-alive 连接
         )
-    out_json = []
     out_dir_md = os.path.join(args.out, "diagnose_CoT")
     if args.format=="md": os.makedirs(out_dir_md, exist_ok=True)
 
-    pbar = tqdm(total=len(rows), desc="diagnose")
-    for r in rows:
-        cid = r.get("id"); ctext = r.get("candidate","")
-        if not ctext.strip():
-            pbar.update(1); continue
-        if args.format=="json":
-            facts = parse_core_facts_from_report(ctext)
-            out_json.append({"id": cid, "facts": facts})
-        else:
+    pbar = tqdm(desc="diagnose", unit="rec")
+    if args.format=="json":
+        # 规则解析是纯 CPU 的：按批处理（重复报告只解析一次），边解析边写出
+        cache = None
+        if args.cache_dir:
+            os.makedirs(args.cache_dir, exist_ok=True)
+            cache = shelve.open(os.path.join(args.cache_dir, "diagnose_facts"))
+        def _json_rows():
+            batch = []
+            def flush():
+                facts_list = parse_core_facts_batch([ctext for _, ctext in batch], cache=cache)
+                pbar.update(len(batch))
+                for (cid, _), facts in zip(batch, facts_list):
+                    yield {"id": cid, "facts": facts}
+            for item in _candidates(rows, pbar):
+                batch.append(item)
+                if len(batch) >= _JSON_BATCH:
+                    yield from flush(); batch = []
+            if batch:
+                yield from flush()
+        try:
+            write_jsonl(_json_rows(), os.path.join(args.out, "diagnose.jsonl"))
+        finally:
+            shutdown_parse_pool()
+            if cache is not None: cache.close()
+    else:
+        timeout_s = int(cfg.get("LLM_TIMEOUT_DIAGNOSE", cfg.get("LLM_TIMEOUT", 90)))
+        def _diagnose_one(cid, ctext):
             if args.mode=="cot":
-                md_body = diagnose_crash_report_cot(ctext, llm, cfg, timeout_s=int(cfg.get("LLM_TIMEOUT_DIAGNOSE", cfg.get("LLM_TIMEOUT", 90))))
+                md_body = diagnose_crash_report_cot(ctext, llm, cfg, timeout_s=timeout_s)
             else:
                 md_body = diagnose_crash_report(ctext)
+            # 每条记录写自己的文件（按 cid 命名），完成顺序不影响输出
             with open(os.path.join(out_dir_md, f"{cid}.md"), "w", encoding="utf-8") as f:
                 f.write(f"# Report Explain for {cid}\n\n{md_body}\n")
-        pbar.update(1)
-    pbar.close()
 
-    if args.format=="json":
-        write_jsonl(out_json, os.path.join(args.out, "diagnose.jsonl"))
+        if args.mode=="cot":
+            # 瓶颈是阻塞的 HTTP 调用：多线程并发重叠等待时间；
+            # 在途任务数有上限，输入仍是流式读取
+            max_workers = max(1, int(cfg.get("LLM_CONCURRENCY", 2)))
+            configure_timeout_pool(max_workers)
+            pending = {}
+            def finish(done):
+                for fut in done:
+                    pending.pop(fut)
+                    fut.result()   # 和 rules 模式一样：单条失败直接抛出，中止整次运行
+                    pbar.update(1)
+            try:
+                with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                    for cid, ctext in _candidates(rows, pbar):
+                        if len(pending) >= max_workers * 4:
+                            finish(wait(pending, return_when=FIRST_COMPLETED).done)
+                        pending[pool.submit(_diagnose_one, cid, ctext)] = cid
+                    finish(list(as_completed(list(pending))))
+            finally:
+                llm.close()   # 释放 keep-alive 连接池
+        else:
+            for cid, ctext in _candidates(rows, pbar):
+                _diagnose_one(cid, ctext)
+                pbar.update(1)
+    pbar.close()
 
 if __name__ == "__main__":
     main()
@@ -14,25 +14,126 @@ python -m logagents.pipelines.pl_extract \
 python -m logagents.pipelines.pl_extract --logs ./preprocess/bug01/logs.jsonl --out  ./out/full --span full --mode ai_try --compact --explain sidecar --include_diag true   
 """
 # -*- coding: utf-8 -*-
-import os, argparse
-from collections import defaultdict, deque
+import os, json, time, argparse, logging, hashlib, threading, shelve
+from collections import defaultdict, deque, OrderedDict
+from itertools import chain, groupby
+from contextlib import nullcontext, ExitStack
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from typing import Dict, List
 from tqdm import tqdm
 
-from ..core.io_utils import read_jsonl, write_jsonl, read_config
-from ..core.chunking import make_windows, Task, schedule_adaptive, _run_with_timeout, RE_ANCHORS, RE_SECONDARY
-from ..core.prompts import SYZBOT_RULES, build_fx_fz_prompts, align_answer_to_chunks, FEWSHOT_FULL, FEWSHOT_LIGHT
+from ..core.io_utils import read_jsonl_list, append_jsonl, read_config
+from ..core.chunking import make_windows, pack_chunk_groups, BatchController, Task, schedule_adaptive, _run_with_timeout, configure_timeout_pool, find_anchor_lines
+from ..core.prompts import SYZBOT_RULES, BLOCK_TEMPLATE, build_fx_fz_prompt_parts, align_answer_to_chunks
 from ..core.sanitize import sanitize_from_log
-from ..core.augment import augment_missing_sections, augment_diagnostics_tail
+from ..core.augment import augment_missing_sections_lines, augment_diagnostics_tail_lines
 from ..core.ordering import order_normalize
 from ..core.policy import SyzPolicy, apply_syzbot_policy, split_into_buckets
 from ..core.explain import ExplainRecorder
-from ..core.fallback import rule_extract_fallback
+from ..core.fallback import rule_extract_fallback, rule_extract_precompute, shutdown_fallback_pool
 
 # NOTE: expect llm_client.py in PYTHONPATH as before
 from llm_client import LLMClient
 
-def main():
+log = logging.getLogger(__name__)
+
+def _chunk_digest(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+# 进程内跨日志复用的模型输出：(chunk 内容摘要, fewshot 档位, tok_budget) -> 该 chunk 对齐后的原始输出；
+# sanitize 仍按当前日志做，所以只缓存模型输出本身。LOGAGENTS_SEG_CACHE=0 关闭
+_SEG_CACHE_MAX = int(os.environ.get("LOGAGENTS_SEG_CACHE", "4096"))
+_seg_cache: "OrderedDict[tuple, str]" = OrderedDict()
+_seg_lock = threading.Lock()
+
+def _seg_cache_get(keys):
+    """keys 全部命中时返回对应输出列表，否则 None（部分命中照常调用 LLM）。"""
+    if _SEG_CACHE_MAX <= 0:
+        return None
+    with _seg_lock:
+        if not all(k in _seg_cache for k in keys):
+            return None
+        for k in keys:
+            _seg_cache.move_to_end(k)
+        return [_seg_cache[k] for k in keys]
+
+def _seg_cache_put(keys, segs):
+    if _SEG_CACHE_MAX <= 0:
+        return
+    with _seg_lock:
+        for k, seg in zip(keys, segs):
+            _seg_cache[k] = seg
+            _seg_cache.move_to_end(k)
+        while len(_seg_cache) > _SEG_CACHE_MAX:
+            _seg_cache.popitem(last=False)
+
+def _bucket_line_count(buckets) -> int:
+    """== len("\n".join(sum(buckets.values(), [])).splitlines())，不拼列表也不拼字符串。"""
+    # 桶里的行来自 splitlines，本身不含换行符：只有最后一行是 "" 时 join 后会少算一行
+    n = 0; last = None
+    for v in buckets.values():
+        if v:
+            n += len(v); last = v[-1]
+    return n - (last == "")
+
+_PLAN_CACHE_VERSION = "1"   # make_windows / 锚点扫描逻辑变了就改这里，旧缓存自动失效
+
+def _plan_windows(logtxt: str, lines: List[str], max_lines: int, stride: int, cache=None):
+    """(spans, span_mode, anchors)；cache 是 shelve 之类的映射，按日志内容哈希 + 切窗参数复用上次的结果。"""
+    key = None
+    if cache is not None:
+        h = hashlib.blake2b(digest_size=16)
+        h.update(f"{_PLAN_CACHE_VERSION}|{max_lines}|{stride}|".encode())
+        h.update(logtxt.encode("utf-8", "surrogatepass"))
+        key = h.hexdigest()
+        hit = cache.get(key)
+        if hit is not None:
+            return hit
+    spans, span_mode = make_windows(lines, max_lines=max_lines, stride=stride)
+    try:
+        anchors = find_anchor_lines(lines)
+    except Exception:
+        anchors = None
+    plan = (spans, span_mode, anchors)
+    if key is not None:
+        cache[key] = plan
+    return plan
+
+def _row_cache_key(run_fp: str, gid_all: str, logtxt: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for part in (run_fp, gid_all, logtxt):
+        h.update(part.encode("utf-8", "surrogatepass")); h.update(b"\0")
+    return h.hexdigest()
+
+def _write_sidecar_md(side_dir: str, ex: dict) -> None:
+    gid = ex["gid"]
+    md = []
+    md.append(f"# Explain for {gid}\n")
+    p = ex["pipeline"]
+    md.append(f"- span_mode: **{p['span_mode']}**, token_budget={p['token_budget']}, max_lines_per_chunk={p['max_lines_per_chunk']}, stride={p['stride']}, group_size={p['group_size']}\n")
+    md.append("## Anchors\n")
+    md.append(f"- primary hits: {len(ex['anchors'].get('primary',[]))}, secondary hits: {len(ex['anchors'].get('secondary',[]))}\n")
+    md.append("## Chunks & Sanitization\n")
+    for c in ex["chunks"]:
+        md.append(f"- {c['chunk_id']}: fewshot={c['fewshot_level']}, model_out={c['model_out_len']} lines, kept={c['kept_lines']} {'('+c['dropped_reason']+')' if c['dropped_reason'] else ''}")
+    md.append("\n## Merge\n")
+    m = ex["merge"]; md.append(f"- segments={m['segments']}, lines_before={m['lines_before']}, lines_after={m['lines_after']}\n")
+    md.append("## Augmentation\n")
+    md.append(f"- missing sections added: {ex['augment']['missing_sections_added']}\n")
+    md.append(f"- diagnostics blocks added: {ex['augment']['diagnostics_blocks_added']}\n")
+    md.append("## Order Normalization\n")
+    on = ex["order_norm"]; md.append(f"- before: {on['before_sections']}\n- after: {on['after_sections']}\n")
+    md.append("## Policy & Caps\n")
+    pol = ex["policy"]
+    md.append(f"- include_diag={pol['include_diag']}, question_mark_filtered={pol['question_mark_filtered']}\n")
+    md.append(f"- caps: {pol['caps']}\n")
+    if ex["prompt_tips"]:
+        md.append("## Prompt/Strategy Tips\n")
+        for t in ex["prompt_tips"]: md.append(f"- {t}")
+    with open(os.path.join(side_dir, f"{gid}.md"), "w", encoding="utf-8") as f:
+        f.write("\n".join(md))
+
+def _main(stack: ExitStack):
     parser = argparse.ArgumentParser()
     parser.add_argument('--logs', required=True)
     parser.add_argument('--out', required=True)
@@ -54,8 +155,14 @@ def main():
     parser.add_argument('--freed_max', type=int, default=80)
     parser.add_argument('--buggy_max', type=int, default=80)
     parser.add_argument('--diag_total_max', type=int, default=400)
+    parser.add_argument('--cache_dir', default=None)   # 按日志内容哈希缓存切窗/锚点结果，重跑时跳过
+    parser.add_argument('--verbose', action='store_true')   # 打开 [LLM_CALL]/[POLICY] 等逐条调试输出
     args = parser.parse_args()
 
+    # [LLM_CALL]/[POLICY]/[ORDER] 等诊断输出走 logging：--verbose 或 LOGAGENTS_LOG_LEVEL=DEBUG 恢复逐条打印
+    level = "DEBUG" if args.verbose else os.environ.get("LOGAGENTS_LOG_LEVEL", "WARNING").upper()
+    logging.basicConfig(level=level, format="%(message)s")
+
     os.makedirs(args.out, exist_ok=True)
     cfg = read_config("config.json")
 
@@ -68,41 +175,111 @@ def main():
     from ..core import prompts as _P
     _P.FEWSHOT_FULL = _maybe_read(args.fewshot_full) or _P.FEWSHOT_FULL
     _P.FEWSHOT_LIGHT= _maybe_read(args.fewshot_light) or _P.FEWSHOT_LIGHT
+    # fewshot_level -> fewshot 文本，只在这里取一次；其余档位（0）不带 fewshot
+    fewshot_by_level = {2: _P.FEWSHOT_FULL, 1: _P.FEWSHOT_LIGHT}
 
-    llm = LLMClient(
+    llm = stack.enter_context(LLMClient(
         cfg.get("API_URL"),
         cfg.get("API_KEY"),
         cfg.get("MODEL"),
         timeout=int(cfg.get("LLM_TIMEOUT", 90)),
         retries=int(cfg.get("LLM_RETRIES", 0)),
         connect_timeout=int(cfg.get("LLM_CONNECT_TIMEOUT", 10)),
-        read_timeout=int(cfg.get("LLM_READ_TIMEOUT", 55))
-    )
+        read_timeout=int(cfg.get("LLM_READ_TIMEOUT", 55)),
+        pool_size=int(cfg.get("LLM_CONCURRENCY", 2))   # 每个工作线程一条 keep-alive 连接
+    ))
 
     token_budget = int(cfg.get("token_budget", 500))
     max_lines    = int(cfg.get("max_lines_per_chunk", 60))
     stride       = int(cfg.get("chunk_stride", 50))
     max_workers  = int(cfg.get("LLM_CONCURRENCY", 2))
+    configure_timeout_pool(max_workers)
     timeout_s    = int(cfg.get("LLM_TIMEOUT", 90))
-    group_size   = int(cfg.get("group_size", 1))
-
-    logs = read_jsonl(args.logs)
+    # group_size="auto"：按 token 预算把相邻 chunk 打包进同一次调用，摊薄每次调用的固定开销
+    # group_size="adaptive"：同样按预算打包，但每组 chunk 数上限由 BatchController 按最近调用耗时调整
+    group_size   = cfg.get("group_size", 1)
+    adaptive     = str(group_size).lower() == "adaptive"
+    auto_group   = adaptive or str(group_size).lower() == "auto"
+    if not auto_group: group_size = int(group_size)
+    group_max    = int(cfg.get("group_size_max", 8))
+    batch_ctl    = BatchController(timeout_s, start=1, max_size=group_max) if adaptive else None
+    cache_control = bool(cfg.get("PROMPT_CACHE_CONTROL", False))
+
+    logs = read_jsonl_list(args.logs)
     pbar_logs = tqdm(total=len(logs), desc="logs", position=0)
 
-    all_candidates = []
-    all_explains   = []
+    # 候选逐条写入 candidates.jsonl（不再整批攒在内存里最后一次写）
+    cand_f = stack.enter_context(open(os.path.join(args.out, "candidates.jsonl"), "wb"))
+    stream_explain = args.explain in ("json", "sidecar")
+    side_dir = os.path.join(args.out, "explain_sidecar")
+    has_any_candidate = False
+    pending_explains = []   # 还没见到非空候选之前的 explain
+    ex_f = None
+
+    plan_cache = None
+    if args.cache_dir:
+        os.makedirs(args.cache_dir, exist_ok=True)
+        plan_cache = stack.enter_context(shelve.open(os.path.join(args.cache_dir, "extract_plan")))
+
+    # 整行结果缓存：(本次运行的模型/提示词/切窗/策略参数指纹, id, 日志原文) 都没变就直接复用上次的候选和 explain
+    row_cache = None
+    if args.cache_dir:
+        row_cache = stack.enter_context(shelve.open(os.path.join(args.cache_dir, "extract_rows")))
+    run_fp = json.dumps({
+        "model": cfg.get("MODEL"), "temperature": cfg.get("temperature_report", 0.0),
+        "rules": SYZBOT_RULES, "block": BLOCK_TEMPLATE,
+        "fewshot_full": _P.FEWSHOT_FULL, "fewshot_light": _P.FEWSHOT_LIGHT,
+        "token_budget": token_budget, "max_lines": max_lines, "stride": stride,
+        "group_size": group_size, "group_max": group_max,
+        "span": args.span, "include_diag": str(args.include_diag),
+        "caps": [args.call_trace_max, args.alloc_max, args.freed_max, args.buggy_max, args.mem_hex_max, args.diag_total_max],
+    }, sort_keys=True, ensure_ascii=False)
+
+    def emit_row(gid_all, candidate_text, ex):
+        nonlocal has_any_candidate, ex_f, pending_explains
+        append_jsonl(cand_f, {"id": gid_all, "candidate": candidate_text})
+        if stream_explain:
+            if not has_any_candidate and candidate_text.strip():
+                # 第一条非空候选出现后才建 explain 输出（全空时不写），之前暂存的补写出去
+                has_any_candidate = True
+                if args.explain == "json":
+                    ex_f = stack.enter_context(open(os.path.join(args.out, "explain.jsonl"), "wb"))
+                else:
+                    os.makedirs(side_dir, exist_ok=True)
+            pending_explains.append(ex)
+            if has_any_candidate:
+                for ex in pending_explains:
+                    if ex_f is not None: append_jsonl(ex_f, ex)
+                    else: _write_sidecar_md(side_dir, ex)
+                pending_explains = []
+        pbar_logs.update(1)
+
+    # 整个进程共用一个 LLM 线程池（不再每条日志建/销毁一次）；各条日志仍各自等自己的任务全部完成
+    stack.callback(shutdown_fallback_pool)
+    llm_pool = stack.enter_context(ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-extract"))
 
     for row in logs:
         gid_all = row.get("id") or row.get("gid") or "sample"
         logtxt = row.get("log") or row.get("text") or ""
+        row_key = _row_cache_key(run_fp, gid_all, logtxt) if row_cache is not None else None
+        hit = row_cache.get(row_key) if row_key is not None else None
+        if hit is not None:
+            tqdm.write(f"[{gid_all}] unchanged since last run, reusing cached candidate")
+            emit_row(gid_all, *hit)
+            continue
         lines  = logtxt.splitlines()
+        used_fallback = False
 
         rec = ExplainRecorder(gid_all)
-        rec.set_pipeline(token_budget=token_budget, max_lines_per_chunk=max_lines, stride=stride, group_size=group_size)
+        row_group_max = batch_ctl.suggest_group_size() if batch_ctl is not None else group_max
+        rec.set_pipeline(token_budget=token_budget, max_lines_per_chunk=max_lines, stride=stride,
+                         group_size=(f"adaptive:{row_group_max}" if batch_ctl is not None else group_size))
 
-        spans, span_mode = make_windows(lines, max_lines=max_lines, stride=stride)
+        spans, span_mode, anchors = _plan_windows(logtxt, lines, max_lines, stride, cache=plan_cache)
         rec.note_span_mode(span_mode)
 
+        # gid2text 存 join 好的 chunk 文本，读它的有：_chunk_digest（去重）、pack_chunk_groups（长度）、
+        # build_fx_fz_prompt_parts（prompt）、rule_extract_precompute / rule_extract_fallback（兜底）
         gid2text: Dict[str, str] = {}
         chunk_ids: List[str] = []
         for idx, (s, e) in enumerate(spans, start=1):
@@ -110,95 +287,134 @@ def main():
             chunk_ids.append(gid)
             gid2text[gid] = "\n".join(lines[s:e])
 
-        id_groups: List[List[str]] = [chunk_ids[i:i+group_size] for i in range(0, len(chunk_ids), group_size)]
-        tqdm.write(f"[{gid_all}] compact={bool(args.compact)} chunks={len(chunk_ids)} prompts={len(id_groups)} "
+        # 内容完全相同的窗口只派一次 LLM（取第一个 gid 做代表），结果最后再分给同内容的其它 chunk
+        gid2hash = {gid: _chunk_digest(gid2text[gid]) for gid in chunk_ids}
+        hash2gids: Dict[str, List[str]] = defaultdict(list)
+        for gid in chunk_ids:
+            hash2gids[gid2hash[gid]].append(gid)
+        uniq_ids = [gs[0] for gs in hash2gids.values()]
+
+        if auto_group:
+            # 与 build_fx_fz_prompts 的字符预算一致，组内 chunk 不会被截断
+            id_groups = pack_chunk_groups(uniq_ids, gid2text, max(token_budget, 200) * 4, max_group=row_group_max)
+        else:
+            id_groups = [uniq_ids[i:i+group_size] for i in range(0, len(uniq_ids), group_size)]
+        tqdm.write(f"[{gid_all}] compact={bool(args.compact)} chunks={len(chunk_ids)} unique={len(uniq_ids)} prompts={len(id_groups)} "
                    f"tok_budget={token_budget} lines_per_chunk={max_lines} stride={stride} windows={span_mode}")
 
-        try:
-            rec.note_anchors({
-                "primary": [i for i,l in enumerate(lines) if any(p.search(l) for p in RE_ANCHORS)],
-                "secondary": [i for i,l in enumerate(lines) if any(p.search(l) for p in RE_SECONDARY)],
-            })
-        except Exception:
-            pass
+        if anchors is not None:
+            rec.note_anchors(anchors)
 
-        from concurrent.futures import ThreadPoolExecutor, as_completed
         chunk_segments = defaultdict(list)
         done_gids, fail_gids = set(), set()
 
-        from collections import deque
-        workq = deque()
-        for gids in id_groups:
-            workq.append(Task(gids=gids, tok_budget=token_budget, max_lines=max_lines, stride=stride, depth=0, fewshot_level=2))
+        # 统一 FIFO：新任务按 chunk 顺序从左取，重试任务插到队首（保持 schedule_adaptive 给出的顺序）
+        workq = deque(Task(gids=gids, tok_budget=token_budget, max_lines=max_lines, stride=stride, depth=0, fewshot_level=2)
+                      for gids in id_groups)
 
         def build_prompt_for_task(task):
-            from ..core.prompts import FEWSHOT_FULL, FEWSHOT_LIGHT, build_fx_fz_prompts
-            fewshots = FEWSHOT_FULL if task.fewshot_level==2 else (FEWSHOT_LIGHT if task.fewshot_level==1 else None)
-            return build_fx_fz_prompts(task.gids, gid2text, task.tok_budget, task.max_lines, task.stride, fewshots=fewshots)
+            fewshots = fewshot_by_level.get(task.fewshot_level)
+            return build_fx_fz_prompt_parts(task.gids, gid2text, task.tok_budget, task.max_lines, task.stride, fewshots=fewshots)
+
+        def collect_parts(task, parts):
+            result_map = {}; kept_any = False
+            for g in task.gids:
+                seg = parts.get(g, "")
+                kept = sanitize_from_log(seg, logtxt, span=args.span)
+                rec.add_chunk_result(g, "ok", task.fewshot_level, seg, kept, dropped_reason=("empty_after_sanitize" if (seg and not kept) else ""))
+                if kept:
+                    kept_any = True
+                    result_map[g] = "\n".join(kept)
+            return ("ok" if kept_any else "empty"), task, result_map
 
         def submit_and_collect(task):
-            prompt = build_prompt_for_task(task)
-            print(f"[LLM_CALL] ===== 即将调用LLM =====")
-            print(f"[LLM_CALL] 任务: {task.gids}")
-            print(f"[LLM_CALL] 系统提示词: {SYZBOT_RULES}")
-            print(f"[LLM_CALL] 用户提示词长度: {len(prompt)} 字符")
-            print(f"[LLM_CALL] 用户提示词前200字符: {prompt[:200]}")
+            cache_keys = [(gid2hash[g], task.fewshot_level, task.tok_budget) for g in task.gids]
+            cached = _seg_cache_get(cache_keys)
+            if cached is not None:
+                return collect_parts(task, dict(zip(task.gids, cached)))
+            static, dynamic = build_prompt_for_task(task)
+            prompt = static + dynamic
+            user_content = prompt
+            if cache_control and static:
+                # 显式标记静态前缀（Anthropic 风格 cache_control）；其余服务按字节前缀自动缓存
+                user_content = [
+                    {"type": "text", "text": static, "cache_control": {"type": "ephemeral"}},
+                    {"type": "text", "text": dynamic},
+                ]
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("[LLM_CALL] ===== 即将调用LLM =====")
+                log.debug("[LLM_CALL] 任务: %s", task.gids)
+                log.debug("[LLM_CALL] 系统提示词: %s", SYZBOT_RULES)
+                log.debug("[LLM_CALL] 用户提示词长度: %d 字符", len(prompt))
+                log.debug("[LLM_CALL] 用户提示词前200字符: %s", prompt[:200])
             def _call():
                 try:
                     result = llm.chat(
                         [
                             {"role": "system", "content": SYZBOT_RULES},
-                            {"role": "user", "content": prompt}
+                            {"role": "user", "content": user_content}
                         ],
                         temperature=float(cfg.get("temperature_report", 0.0)),
                         _retries=0
                     )
                     
-                    print(f"[LLM_CALL] LLM调用成功!")
-                    print(f"[LLM_CALL] 返回长度: {len(result)} 字符")
-                    print(f"[LLM_CALL] 返回类型: {type(result)}")
-                    print(f"[LLM_CALL] 返回内容: '{result}'")  # 用引号包围，看清楚是否真的为空
-                    print(f"[LLM_CALL] ===== LLM调用结束 =====")
+                    if log.isEnabledFor(logging.DEBUG):
+                        log.debug("[LLM_CALL] LLM调用成功!")
+                        log.debug("[LLM_CALL] 返回长度: %d 字符", len(result))
+                        log.debug("[LLM_CALL] 返回类型: %s", type(result))
+                        log.debug("[LLM_CALL] 返回内容: '%s'", result)  # 用引号包围，看清楚是否真的为空
+                        log.debug("[LLM_CALL] ===== LLM调用结束 =====")
                     
                     return result
                 except Exception as e:
-                    print(f"[LLM_CALL] LLM调用失败: {e}")
+                    log.warning("[LLM_CALL] LLM调用失败: %s", e)
                     raise e
 
+            t0 = time.monotonic()
             try:
                 out_text = _run_with_timeout(
                     desc=f"[{gid_all}] batch {task.gids[0]}..{task.gids[-1]} (d{task.depth},fs{task.fewshot_level},tok{task.tok_budget})",
                     timeout_s=timeout_s, func=_call
                 )
             except TimeoutError:
+                if batch_ctl is not None: batch_ctl.observe(len(prompt), timeout_s, "timeout")
                 for g in task.gids:
                     rec.add_chunk_result(g, "timeout", task.fewshot_level, "", [], dropped_reason="timeout")
                 return "timeout", task, {}
+            except Exception:
+                if batch_ctl is not None: batch_ctl.observe(len(prompt), time.monotonic() - t0, "bad")
+                raise
 
             try:
                 parts = align_answer_to_chunks(out_text, task.gids)
             except Exception:
+                if batch_ctl is not None: batch_ctl.observe(len(prompt), time.monotonic() - t0, "bad")
                 for g in task.gids:
                     rec.add_chunk_result(g, "bad", task.fewshot_level, "", [], dropped_reason="parse_fail")
                 return "bad", task, {}
+            if batch_ctl is not None: batch_ctl.observe(len(prompt), time.monotonic() - t0, "ok")
 
-            result_map = {}; kept_any = False
-            for g in task.gids:
-                seg = parts.get(g, "")
-                kept = sanitize_from_log(seg, logtxt, span=args.span)
-                rec.add_chunk_result(g, "ok", task.fewshot_level, seg, kept, dropped_reason=("empty_after_sanitize" if (seg and not kept) else ""))
-                if kept:
-                    kept_any = True
-                    result_map[g] = "\n".join(kept)
-            return ("ok" if kept_any else "empty"), task, result_map
+            _seg_cache_put(cache_keys, [parts.get(g, "") for g in task.gids])
+            return collect_parts(task, parts)
+
+        # 第一批 LLM 请求占不满 worker 时，用空闲 worker 投机地把本条日志的规则兜底结果算好；
+        # 真正兜底时直接取 future 的结果，没有投机计算则由 rule_extract_fallback 当场算
+        fb_future = None
+        def run_fallback(gids):
+            pre = fb_future.result() if fb_future is not None else None
+            return rule_extract_fallback(logtxt, gids, gid2text, precomputed=pre)
 
-        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        with nullcontext(llm_pool) as pool:
             futures = {}
             def submit_task(t): futures[pool.submit(submit_and_collect, t)] = t
             while workq and len(futures) < max_workers:
-                submit_task(workq.pop())
-            while futures or workq:
-                for fut in as_completed(list(futures.keys())):
+                submit_task(workq.popleft())
+            if len(futures) < max_workers:
+                fb_future = pool.submit(rule_extract_precompute, list(chain.from_iterable(id_groups)), gid2text)
+            # 每轮把所有已完成的 future 都处理掉，并随时补充新任务（不再每完成一个就重建等待集合）
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for fut in done:
                     t = futures.pop(fut)
                     try:
                         status, task, result_map = fut.result()
@@ -215,7 +431,8 @@ def main():
                             for nt in reversed(new_tasks): workq.appendleft(nt)
                             postfix = f"retry(d={task.depth})"
                         else:
-                            fb = rule_extract_fallback(logtxt, task.gids, gid2text)
+                            fb = run_fallback(task.gids)
+                            used_fallback = True
                             for g, txt in fb.items():
                                 if txt:
                                     chunk_segments[g].append(txt); done_gids.add(g)
@@ -227,39 +444,52 @@ def main():
                     while workq and len(futures) < max_workers:
                         submit_task(workq.popleft())
                     tqdm.write(f"[{gid_all}] {task.gids} -> {postfix}")
-                    break
+            if fb_future is not None and fb_future.cancel():
+                fb_future = None   # 还没开始算就不再占用 worker
 
-        remaining = set(sum(id_groups, [])) - done_gids
+        remaining = set(chain.from_iterable(id_groups)) - done_gids
         if remaining:
-            fb = rule_extract_fallback(logtxt, list(remaining), gid2text)
+            fb = run_fallback(list(remaining))
+            used_fallback = True
             for g, txt in fb.items():
                 if txt:
                     chunk_segments[g].append(txt); done_gids.add(g)
                 else:
                     fail_gids.add(g)
 
+        # 把代表 chunk 的结果分给内容相同的其它 chunk
+        for gs in hash2gids.values():
+            rep = gs[0]
+            for g in gs[1:]:
+                if rep in chunk_segments:
+                    chunk_segments[g] = list(chunk_segments[rep]); done_gids.add(g)
+                elif rep in fail_gids:
+                    fail_gids.add(g)
+                rec.add_chunk_result(g, "dedup", None, "", [], dropped_reason=f"same_text_as:{rep}")
+
         tqdm.write(f"[{gid_all}] finished. ok={len(done_gids)} fail={len(fail_gids)}")
 
         ordered_chunks = [f"{gid_all}#c{i+1}" for i in range(len(spans))]
-        merged_lines = []
-        last_line = None
-        seg_cnt = 0
-        for cg in ordered_chunks:
-            for seg in chunk_segments.get(cg, []):
-                seg_cnt += 1
-                for ln in seg.splitlines():
-                    if ln != last_line:
-                        merged_lines.append(ln)
-                    last_line = ln
-        candidate_text = "\n".join(merged_lines).strip("\n")
-        rec.note_merge(seg_cnt, before_lines=len(merged_lines), after_lines=len(candidate_text.splitlines()))
+        segs = [seg for cg in ordered_chunks for seg in chunk_segments.get(cg, [])]
+        seg_cnt = len(segs)
+        # 相邻重复行只留一行（跨段也算相邻）：groupby 在 C 层完成比较
+        merged_lines = [ln for ln, _ in groupby(chain.from_iterable(seg.splitlines() for seg in segs))]
+        # == "\n".join(merged_lines).strip("\n")：行里不含换行符，strip 只会去掉首尾的空行，
+        # 直接按下标裁掉，行数也不必再 splitlines 数一遍
+        lo, hi = 0, len(merged_lines)
+        while lo < hi and not merged_lines[lo]: lo += 1
+        while hi > lo and not merged_lines[hi - 1]: hi -= 1
+        candidate_text = "\n".join(merged_lines[lo:hi])
+        rec.note_merge(seg_cnt, before_lines=len(merged_lines), after_lines=hi - lo)
 
         before_sections = []  # kept minimal to avoid heavy dependency
 
         if candidate_text:
             # 1) 补段
-            candidate_text = augment_missing_sections(lines, candidate_text)
-            candidate_text = augment_diagnostics_tail(lines, candidate_text)
+            # merged_lines 直接作为行列表传入（补段时本就会丢弃空行），只在最后 join 一次
+            cand_lines = augment_missing_sections_lines(lines, merged_lines)
+            cand_lines = augment_diagnostics_tail_lines(lines, cand_lines)
+            candidate_text = "\n".join(cand_lines)
 
             # 2) 先做策略裁剪（只做“截断/保留”，不关心顺序）
             policy = SyzPolicy(
@@ -275,19 +505,23 @@ def main():
                 ),
             )
             before_buckets = split_into_buckets(candidate_text)
-            qm_before = len("\n".join(sum(before_buckets.values(), [])).splitlines())
-            candidate_text = apply_syzbot_policy(candidate_text, policy)
-            after_buckets  = split_into_buckets(candidate_text)
-            qm_after  = len("\n".join(sum(after_buckets.values(), [])).splitlines())
+            qm_before = _bucket_line_count(before_buckets)
+            policed = apply_syzbot_policy(candidate_text, policy)
+            if policed == candidate_text:
+                # 常见情况：没有时间戳/问号/重复行要去掉，文本原样返回，直接复用 before 的分桶
+                after_buckets, qm_after = before_buckets, qm_before
+            else:
+                after_buckets  = split_into_buckets(policed)
+                qm_after  = _bucket_line_count(after_buckets)
+            candidate_text = policed
 
             # 3) 最后一遍排序归一 + 缝合（确保 RIP/REGS 在尾部、Call Trace 成块、CPU/HW 只留最佳）
             candidate_text = order_normalize(candidate_text)
-            caps = {}
             # simple caps diff for explain
-            for k in before_buckets.keys():
-                b=len(before_buckets.get(k,[]) or [])
-                a=len(after_buckets.get(k,[]) or [])
-                caps[k]={"before":b,"after":a,"trimmed":max(0,b-a)}
+            caps = {}
+            for k, bl in before_buckets.items():
+                b, a = len(bl), len(after_buckets.get(k) or [])
+                caps[k] = {"before": b, "after": a, "trimmed": max(0, b - a)}
             caps["__notes__"]={
                 "call_trace_max": policy.call_trace_max,
                 "alloc_max": policy.alloc_max,
@@ -298,50 +532,25 @@ def main():
             }
             rec.note_policy_caps(caps, include_diag=policy.include_diag, qm_filtered=max(0, qm_before - qm_after))
 
-        all_candidates.append({"id": gid_all, "candidate": candidate_text})
-        all_explains.append(rec.to_json())
-        pbar_logs.update(1)
-
-    has_any_candidate = any((r.get("candidate") or "").strip() for r in all_candidates)
-
-    write_jsonl(all_candidates, os.path.join(args.out, "candidates.jsonl"))
+        ex = rec.to_json() if (stream_explain or row_key is not None) else None
+        if row_key is not None and not used_fallback:
+            # 有 chunk 走了规则兜底说明 LLM 这次没成功，不缓存，下次重跑再试
+            row_cache[row_key] = (candidate_text, ex)
+        emit_row(gid_all, candidate_text, ex)
+    # 按登记的逆序关闭（线程池先于 shelve 缓存和 LLM 连接），全部落盘后再报告完成
+    stack.close()
     tqdm.write(f"[pipeline] Done. Artifacts in {args.out}")
 
-    if args.explain in ("json","sidecar") and has_any_candidate:
+    if has_any_candidate:
         if args.explain == "json":
-            write_jsonl(all_explains, os.path.join(args.out, "explain.jsonl"))
             tqdm.write("[explain] wrote explain.jsonl")
-        else:
-            side_dir = os.path.join(args.out, "explain_sidecar")
-            os.makedirs(side_dir, exist_ok=True)
-            for ex in all_explains:
-                gid = ex["gid"]
-                md = []
-                md.append(f"# Explain for {gid}\n")
-                p = ex["pipeline"]
-                md.append(f"- span_mode: **{p['span_mode']}**, token_budget={p['token_budget']}, max_lines_per_chunk={p['max_lines_per_chunk']}, stride={p['stride']}, group_size={p['group_size']}\n")
-                md.append("## Anchors\n")
-                md.append(f"- primary hits: {len(ex['anchors'].get('primary',[]))}, secondary hits: {len(ex['anchors'].get('secondary',[]))}\n")
-                md.append("## Chunks & Sanitization\n")
-                for c in ex["chunks"]:
-                    md.append(f"- {c['chunk_id']}: fewshot={c['fewshot_level']}, model_out={c['model_out_len']} lines, kept={c['kept_lines']} {'('+c['dropped_reason']+')' if c['dropped_reason'] else ''}")
-                md.append("\n## Merge\n")
-                m = ex["merge"]; md.append(f"- segments={m['segments']}, lines_before={m['lines_before']}, lines_after={m['lines_after']}\n")
-                md.append("## Augmentation\n")
-                md.append(f"- missing sections added: {ex['augment']['missing_sections_added']}\n")
-                md.append(f"- diagnostics blocks added: {ex['augment']['diagnostics_blocks_added']}\n")
-                md.append("## Order Normalization\n")
-                on = ex["order_norm"]; md.append(f"- before: {on['before_sections']}\n- after: {on['after_sections']}\n")
-                md.append("## Policy & Caps\n")
-                pol = ex["policy"]
-                md.append(f"- include_diag={pol['include_diag']}, question_mark_filtered={pol['question_mark_filtered']}\n")
-                md.append(f"- caps: {pol['caps']}\n")
-                if ex["prompt_tips"]:
-                    md.append("## Prompt/Strategy Tips\n")
-                    for t in ex["prompt_tips"]: md.append(f"- {t}")
-                with open(os.path.join(side_dir, f"{gid}.md"), "w", encoding="utf-8") as f:
-                    f.write("\n".join(md))
+        elif args.explain == "sidecar":
             tqdm.write(f"[explain] wrote sidecar markdowns in {side_dir}")
 
+def main():
+    # 输出文件、shelve 缓存、线程池和 LLM 连接都登记在同一个 ExitStack 上，中途抛异常也会关闭/落盘
+    with ExitStack() as stack:
+        _main(stack)
+
 if __name__ == "__main__":
     main()
@@ -2,6 +2,11 @@ import os
 import glob
 import json
 
+try:
+    import orjson
+except ImportError:  # falls back to the stdlib json module
+    orjson = None
+
 # === 配置 ===
 input_dir = "./out/full"          # 输入目录：包含若干 .jsonl
 output_dir = "./readable"         # 输出目录：存放生成的 .txt / .md
@@ -17,29 +22,28 @@ def pick_text_field(rec: dict) -> str:
             return rec[k]
     return ""
 
-def safe_loads(line: str):
+_loads = orjson.loads if orjson is not None else json.loads
+
+def safe_loads(line: bytes):
+    # 直接解析原始 bytes（orjson 不需要先解码成 str）
     try:
-        return json.loads(line)
+        return _loads(line)
     except Exception:
         return None
 
-# 遍历目录下的所有 .jsonl
-jsonl_files = glob.glob(os.path.join(input_dir, "*.jsonl"))
+_TXT_SEP = "\n\n" + "=" * 80 + "\n\n"
 
-for input_file in jsonl_files:
+def process_file(input_file: str):
+    """把一个 .jsonl 转成 TXT/MD 两份可读文件，返回 (out_txt, out_md)。"""
     base = os.path.basename(input_file)
     stem, _ = os.path.splitext(base)
     out_txt = os.path.join(output_dir, f"{stem}_readable.txt")
     out_md  = os.path.join(output_dir, f"{stem}_readable.md")
 
-    # 逐条写 TXT
-    with open(input_file, "r", encoding="utf-8") as fin, \
-         open(out_txt, "w", encoding="utf-8") as ftxt, \
-         open(out_md,  "w", encoding="utf-8") as fmd:
-
-        # Markdown 文件头（可选）
-        fmd.write(f"# {stem} 解析结果\n\n")
-
+    # 两种格式各自攒在内存里，文件结束时各一次性写出
+    txt_buf = []
+    md_buf = [f"# {stem} 解析结果\n\n"]   # Markdown 文件头（可选）
+    with open(input_file, "rb") as fin:
         for line in fin:
             rec = safe_loads(line)
             if not rec:
@@ -48,18 +52,27 @@ for input_file in jsonl_files:
             rid = rec.get("id", "N/A")
             text = pick_text_field(rec)
 
-            # 写 TXT
-            ftxt.write(f"=== ID: {rid} ===\n")
-            ftxt.write(text)
-            ftxt.write("\n\n" + "="*80 + "\n\n")
+            txt_buf.append(f"=== ID: {rid} ===\n{text}{_TXT_SEP}")
+            md_buf.append(f"## {rid}\n\n```\n{text}\n```\n\n")
+
+    with open(out_txt, "w", encoding="utf-8") as ftxt:
+        ftxt.write("".join(txt_buf))
+    with open(out_md, "w", encoding="utf-8") as fmd:
+        fmd.write("".join(md_buf))
+    return out_txt, out_md
 
-            # 写 MD
-            fmd.write(f"## {rid}\n\n")
-            fmd.write("```\n")
-            fmd.write(text)
-            fmd.write("\n```\n\n")
+if __name__ == "__main__":
+    # 遍历目录下的所有 .jsonl；文件之间互不相关，多个文件时每个文件交给一个进程
+    jsonl_files = glob.glob(os.path.join(input_dir, "*.jsonl"))
+    if len(jsonl_files) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(len(jsonl_files), os.cpu_count() or 1)) as pool:
+            results = list(pool.map(process_file, jsonl_files))
+    else:
+        results = [process_file(f) for f in jsonl_files]
 
-    print(f"已生成：{out_txt}")
-    print(f"已生成：{out_md}")
+    for out_txt, out_md in results:
+        print(f"已生成：{out_txt}")
+        print(f"已生成：{out_md}")
 
-print("全部完成 ✅")
+    print("全部完成 ✅")
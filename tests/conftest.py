@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+import os, random, re, sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA = os.path.join(ROOT, "tests", "data")
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+_TS = re.compile(r"^\[[^\]]*\]\s?")
+
+def _read(name: str) -> str:
+    with open(os.path.join(DATA, name), encoding="utf-8") as f:
+        return f.read()
+
+@pytest.fixture(scope="session")
+def kasan_log() -> str:
+    return _read("kasan_uaf.log")
+
+@pytest.fixture(scope="session")
+def log_variants(kasan_log):
+    """样例 syzbot 日志的若干变体（行列表）：原样、去时间戳、固定种子打乱、和随机拼接。"""
+    lines = kasan_log.splitlines()
+    bare = [_TS.sub("", ln) for ln in lines]
+    r = random.Random(1234)
+    out = [lines, bare, [], [""], lines[:5], bare[-12:]]
+    for _ in range(20):
+        ls = list(r.choice((lines, bare))); r.shuffle(ls); out.append(ls)
+    for _ in range(20):
+        out.append([r.choice(lines + bare) for _ in range(r.randint(1, 80))])
+    return out
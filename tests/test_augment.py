@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from logagents.core.augment import (
+    DIAG_PATTERNS, _cand_contains_block, _find_diag_blocks, _is_diag_line, _normalize_text_block,
+    augment_diagnostics_tail,
+)
+
+
+def _ref_is_diag_line(ln):
+    return any(rx.search(ln) for _, rx in DIAG_PATTERNS)
+
+
+def test_is_diag_line_matches_diag_patterns(log_variants):
+    extra = [
+        "Memory state around", "memory STATE around x", " Memory state around", "page: 0xff", "page: zz",
+        "page: ff", "PAGE: ١", "trace: x", "xtrace:", "ftrace", "tracing:", "RSP: 0", " RSP: 0",
+        "R12: 0", "R1: 0", "R١٢: 0", "RſP: 0", "RDI: 1", "RDı: 1", "İRSP: 0",
+        "x RIP: 0010", "Disassembly", "Code: 48", "slab", "kmalloc-256", "éobject", "page_owner",
+    ]
+    lines = [ln for v in log_variants for ln in v] + extra
+    for ln in lines:
+        assert _is_diag_line(ln) == _ref_is_diag_line(ln), repr(ln)
+
+
+def _ref_diagnostics_tail(all_lines, candidate_text):
+    # 改写前的实现：每追加一块就把它的归一化文本拼到 cand_norm 上
+    cand_norm = _normalize_text_block(candidate_text)
+    blocks = _find_diag_blocks(all_lines)
+    if not blocks:
+        return candidate_text
+    out = candidate_text.splitlines()
+    for blk in blocks:
+        if not _cand_contains_block(cand_norm, blk):
+            out.extend(ln for ln in blk if ln.strip())
+            cand_norm += "\n" + _normalize_text_block("\n".join(blk))
+    return "\n".join(out)
+
+
+def test_diagnostics_tail_matches_reference(log_variants, kasan_log):
+    cands = ["", "BUG: KASAN: x", "\n".join(kasan_log.splitlines()[:10])]
+    for lines in log_variants:
+        doubled = lines + lines          # 同一段诊断出现两次：第二次不能再追加
+        for cand in cands:
+            for ls in (lines, doubled):
+                assert augment_diagnostics_tail(ls, cand) == _ref_diagnostics_tail(ls, cand)
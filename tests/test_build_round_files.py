@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import json, random, re
+
+from build_round_files import SKIP_NAMES, build_round_files, is_skip_frame, load_all_bugs_from_crawler
+
+
+# 改写前的正则写法，作为对照
+_REF_SKIP_PREFIX = re.compile(
+    r'^(?:dump_stack|show_stack|print_address|print_report|kasan_report|__pfx_|__warn|'
+    r'warn_slowpath|__virt_addr_valid|kasan_|__asan_|_printk|printk|vprintk|report_bug)\b',
+    re.I
+)
+
+
+def test_is_skip_frame_matches_regex_reference(kasan_log):
+    frames = [ln.split("] ", 1)[-1].strip() for ln in kasan_log.splitlines()]
+    r = random.Random(99)
+    tails = ["", "+0x1/0x2", "_lvl+0x12/0x30", "_x", "2", ".cold", " ", "-", "é", "É", "K"]
+    cands = frames + [name + t for name in SKIP_NAMES for t in tails]
+    cands += [c.upper() for c in cands] + ["", "_", "Kasan_report+0x1/0x2", "İprintk", "printkİ"]
+    for _ in range(5000):
+        cands.append(r.choice(SKIP_NAMES)[:r.randint(0, 20)] + r.choice(tails))
+    for c in cands:
+        assert is_skip_frame(c) == bool(_REF_SKIP_PREFIX.search(c)), repr(c)
+
+
+def test_workers_output_matches_in_process(tmp_path, log_variants, kasan_log):
+    # 3 倍变体 > 一个提交窗口（workers * chunksize * 4 = 128），覆盖跨窗口的顺序
+    bugs = []
+    for i, lines in enumerate(log_variants * 3):
+        text = "\n".join(lines)
+        crash = {"Log": {"content": text}}
+        if i % 3 == 1:
+            crash["Report"] = {"content": kasan_log}
+        bugs.append({"title": f"bug {i}", "extid": f"x{i}", "crashes": [crash],
+                     "crash_report": text if i % 5 == 0 else ""})
+    src = tmp_path / "bugs.json"
+    src.write_text(json.dumps(bugs), encoding="utf-8")
+
+    outs = {}
+    for workers in (1, 2):
+        out = tmp_path / f"w{workers}"
+        build_round_files(load_all_bugs_from_crawler(str(src)), str(out), workers=workers)
+        outs[workers] = {name: (out / name).read_bytes()
+                         for name in ("logs.jsonl", "gold_short.jsonl", "gold_full.jsonl")}
+    assert outs[1]["gold_full.jsonl"]
+    assert outs[2] == outs[1]
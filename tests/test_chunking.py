@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+import random, re, threading
+
+from logagents.core import chunking
+from logagents.core.chunking import _find_anchor_lines, _merge_intervals, chunk_lines, find_anchor_lines
+
+
+# ---- 改写前的逐行实现（每行逐条 search），作为对照 ----
+_REF_PATTERNS = [
+    re.compile(r"BUG:\s*KASAN", re.I),
+    re.compile(r"\bCall Trace:"),
+    re.compile(r"\b(Read|Write) of size \d+", re.I),
+    re.compile(r"\bCPU:\s*\d+", re.I),
+    re.compile(r"\bHardware name:\s*", re.I),
+    re.compile(r"\bAllocated by task\b", re.I),
+    re.compile(r"\bFreed by task\b", re.I),
+    re.compile(r"\bThe buggy address belongs to\b", re.I),
+    re.compile(r"\bMemory state around\b", re.I),
+    re.compile(r"\bpage_owner\b", re.I),
+    re.compile(r"^page:\s*[0-9a-fx]+", re.I),
+    re.compile(r"\b(slab|kmalloc|kmem_cache|object)\b", re.I),
+    re.compile(r"\bDisassembly\b|\bCode:\b", re.I),
+    re.compile(r"\bftrace\b|\btracing\b|^trace:", re.I),
+]
+
+def _ref_chunk_lines(lines, max_lines, stride):
+    spans = []
+    n = len(lines)
+    i = 0
+    while i < n:
+        j = min(i + max_lines, n)
+        spans.append((i, j))
+        if j == n:
+            break
+        i = max(0, j - (max_lines - stride))
+    return spans
+
+def _ref_merge_intervals(intervals, max_lines):
+    if not intervals:
+        return []
+    intervals = sorted(intervals)
+    merged = []
+    for s, e in intervals:
+        if not merged or s > merged[-1][1] - 10:
+            merged.append([s, e])
+        else:
+            merged[-1][1] = max(merged[-1][1], e)
+            if merged[-1][1] - merged[-1][0] > max_lines:
+                merged[-1][1] = merged[-1][0] + max_lines
+    return [(s, e) for s, e in merged]
+
+def _ref_find_anchor_lines(lines, patterns=_REF_PATTERNS):
+    return [i for i, ln in enumerate(lines) if any(p.search(ln) for p in patterns)]
+
+# 非 ASCII 的空白 / 数字 / 单词字符：\s、\d、\b 在这些行上要保持 Unicode 语义
+NON_ASCII_LINES = [
+    "CPU:\u00a01 PID: 2", "CPU: \u0661", "Read of size \u0668 at", "BUG:\u2003KASAN: x",
+    "\u00e9Call Trace:", "\u00e9 Call Trace:", "Hardware name:\u3000QEMU", "\u00e9object",
+    "page:\u00a0ff", "PAGE: \u0661", "Page: 0x1", "trace: \u00e9", "TRACE:", "\u00e9trace:",
+    "\u017ftrace:", "\u0130page: 0x1", "Memory state around\u00e9", "kmalloc\u00b2",
+]
+
+
+def test_find_anchor_lines_matches_per_line_reference(log_variants):
+    extra = [
+        ["CPU:", "CPU: 1", "BUG:\tKASAN", "BUG:", "KASAN", "trace: x", " trace: x", "page: 0xff", "xpage: 0xff"],
+        ["Call Trace:", "call trace:", "objects", "object", "kmalloc-256", "Code: 48"],
+    ]
+    for lines in log_variants + extra:
+        assert _find_anchor_lines(lines) == _ref_find_anchor_lines(lines), lines
+
+
+def test_find_anchor_lines_non_ascii():
+    lines = NON_ASCII_LINES + [ln + " " + ln for ln in NON_ASCII_LINES]
+    assert _find_anchor_lines(lines) == _ref_find_anchor_lines(lines)
+    for ln in NON_ASCII_LINES:
+        assert _find_anchor_lines([ln]) == _ref_find_anchor_lines([ln]), repr(ln)
+    got = find_anchor_lines(lines)
+    assert got["primary"] == _ref_find_anchor_lines(lines, _REF_PATTERNS[:2])
+    assert got["secondary"] == _ref_find_anchor_lines(lines, _REF_PATTERNS[2:])
+
+
+def test_chunk_lines_matches_reference(log_variants):
+    for lines in log_variants:
+        for max_lines in (1, 2, 7, 16, 46, 200):
+            for stride in range(1, max_lines + 3):
+                assert chunk_lines(lines, max_lines, stride) == _ref_chunk_lines(lines, max_lines, stride), \
+                    (len(lines), max_lines, stride)
+
+
+def test_merge_intervals_matches_reference():
+    r = random.Random(7)
+    for _ in range(2000):
+        n = r.randint(0, 300)
+        max_lines = r.choice((5, 20, 40, 120))
+        intervals = []
+        for _ in range(r.randint(0, 30)):
+            s = r.randint(0, n)
+            intervals.append((s, min(n, s + r.randint(0, max_lines))))
+        want = _ref_merge_intervals(intervals, max_lines)
+        assert _merge_intervals(intervals, max_lines) == want, intervals
+        assert _merge_intervals(sorted(intervals), max_lines, presorted=True) == want, intervals
+
+
+def test_configure_timeout_pool_grows_and_lets_old_calls_finish(monkeypatch):
+    monkeypatch.setattr(chunking, "_TIMEOUT_POOL", None)
+    monkeypatch.setattr(chunking, "_TIMEOUT_POOL_WORKERS", 0)
+    monkeypatch.setattr(chunking, "_TIMEOUT_POOL_ENV", 0)
+    chunking.configure_timeout_pool(2)
+    old = chunking._timeout_pool()
+    assert chunking._TIMEOUT_POOL_WORKERS == 4
+    gate = threading.Event()
+    running = old.submit(gate.wait, 5)          # 模拟超时后被放弃、仍在跑的调用
+
+    chunking.configure_timeout_pool(1)          # 更小：保持原池
+    assert chunking._timeout_pool() is old
+    chunking.configure_timeout_pool(5)          # 更大：换新池
+    new = chunking._timeout_pool()
+    assert new is not old and chunking._TIMEOUT_POOL_WORKERS == 10
+    gate.set()
+    assert running.result(timeout=5) is True    # 旧池里的调用照常跑完
+    new.shutdown()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import re
+
+from logagents.core import fallback
+from logagents.core.fallback import rule_extract_fallback, rule_extract_precompute, shutdown_fallback_pool
+
+
+# ---- 改写前的正则抽取，作为对照 ----
+def _ref_extract(s):
+    m = re.search(
+        r"(BUG:\s*KASAN[^\n]*\n(?:.*\n){0,200}?(?:Memory state around[^\n]*\n(?:.*\n){0,200})?)",
+        s, re.M
+    )
+    if m:
+        return m.group(1).strip("\n")
+    m2 = re.search(r"(Call Trace:\n(?:.+\n){1,120})", s, re.M)
+    if m2:
+        return m2.group(1).strip("\n")
+    return ""
+
+
+def test_rule_extract_fallback_matches_regex_reference(log_variants):
+    texts = ["\n".join(ls) + "\n" for ls in log_variants] + ["\n".join(ls) for ls in log_variants] + [
+        "",
+        "Call Trace:\n",
+        "Call Trace:\n\n foo+0x1/0x2\n",
+        "Call Trace:\n foo+0x1/0x2",
+        "x Call Trace:\n foo+0x1/0x2\n bar+0x3/0x4\n\nCall Trace:\n baz+0x1/0x2\n",
+        "BUG:KASAN: x\nMemory state around y\n" + "".join(f" ff{i:04x}: fa fb\n" for i in range(260)),
+        "BUG: \t KASAN: x\n\nMemory state around y\n",
+        "BUG: KASAN: no newline at end",
+        "BUG: kasan lower case\nCall Trace:\n foo+0x1/0x2\n",
+    ]
+    gid2text = {f"g{i}": t for i, t in enumerate(texts)}
+    gids = list(gid2text) + ["missing"]
+    want = {g: _ref_extract(gid2text.get(g, "")) for g in gids}
+    assert rule_extract_fallback("", gids, gid2text) == want
+    pre = rule_extract_precompute(gids, gid2text)
+    assert rule_extract_fallback("", gids, gid2text, precomputed=pre) == want
+
+
+def test_parallel_fallback_reuses_one_pool(log_variants, monkeypatch):
+    gid2text = {f"g{i}": "\n".join(ls) + "\n" for i, ls in enumerate(log_variants)}
+    gids = list(gid2text)
+    want = {g: _ref_extract(gid2text[g]) for g in gids}
+    monkeypatch.setattr(fallback, "_PARALLEL_MIN_CHARS", 0)
+    try:
+        assert rule_extract_fallback("", gids, gid2text) == want
+        pool = fallback._FALLBACK_POOL
+        assert pool is not None
+        assert rule_extract_precompute(gids[:3], gid2text) == rule_extract_precompute(gids[:3], gid2text)
+        assert fallback._FALLBACK_POOL is pool
+    finally:
+        shutdown_fallback_pool()
+    assert fallback._FALLBACK_POOL is None
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+import json, os
+
+from logagents.core.ordering import order_normalize
+
+
+def test_order_normalize_matches_regex_golden():
+    # 期望输出由改写前的正则版 order_normalize（基线提交）对同一批输入生成
+    with open(os.path.join(os.path.dirname(__file__), "data", "order_normalize_golden.json"), encoding="utf-8") as f:
+        cases = json.load(f)
+    assert cases
+    for case in cases:
+        assert order_normalize(case["input"]) == case["expected"], case["input"]
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import random, re
+
+from logagents.core.prompts import align_answer_to_chunks
+
+
+def _ref_align(output_text, gids):
+    # 改写前的实现：每个 gid 单独编译一条正则搜全文
+    res = {gid: "" for gid in gids}
+    for gid in gids:
+        m = re.search(
+            r"###\s*CHUNK\s*{}\s*START\s*\n(.*?)\n###\s*CHUNK\s*{}\s*END".format(re.escape(gid), re.escape(gid)),
+            output_text, re.S | re.I,
+        )
+        if m:
+            res[gid] = m.group(1).strip("\n")
+    return res
+
+
+def test_gid_with_hash():
+    out = "### CHUNK L0#c1 START\na\nb\n### CHUNK L0#c1 END\n### CHUNK L0#c10 START\nc\n### CHUNK L0#c10 END\n"
+    gids = ["L0#c1", "L0#c10", "L0#c2"]
+    assert align_answer_to_chunks(out, gids) == {"L0#c1": "a\nb", "L0#c10": "c", "L0#c2": ""}
+    assert align_answer_to_chunks(out, gids) == _ref_align(out, gids)
+
+
+def test_nested_block_inside_another():
+    out = ("### CHUNK A#c1 START\nx\n### CHUNK A#c2 START\ny\n### CHUNK A#c2 END\nz\n"
+           "### CHUNK A#c1 END\n### chunk a#C3 start\nw\n###CHUNK A#c3 END")
+    gids = ["A#c1", "A#c2", "A#c3"]
+    got = align_answer_to_chunks(out, gids)
+    assert got["A#c2"] == "y"
+    assert got["A#c1"] == "x\n### CHUNK A#c2 START\ny\n### CHUNK A#c2 END\nz"
+    assert got["A#c3"] == "w"
+    assert got == _ref_align(out, gids)
+
+
+def test_align_matches_per_gid_reference():
+    r = random.Random(3)
+    pool = ["L0#c1", "L0#c2", "L0#c10", "l0#C1", "a#b#c", "x", "K1", "k1"]
+    def piece(g):
+        return r.choice([f"### CHUNK {g} START\n", f"###CHUNK{g}START\n", f"### CHUNK {g} END",
+                         f"\n### CHUNK {g} END\n", f"### chunk {g.upper()} start \n",
+                         "line ### x\n", "body line\n", "###\n", "\n"])
+    for _ in range(5000):
+        gids = r.sample(pool, r.randint(1, 5))
+        out = "".join(piece(r.choice(pool)) for _ in range(r.randint(0, 14)))
+        assert align_answer_to_chunks(out, gids) == _ref_align(out, gids), (out, gids)
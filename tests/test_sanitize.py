@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+from logagents.core import sanitize
+from logagents.core.sanitize import _normalize_line, _normalize_text_block, sanitize_from_log
+
+
+def _ref_sanitize(extracted, whole_log_text):
+    # 改写前的实现：每行对全文和归一化全文各做一次子串扫描
+    kept = []
+    norm_whole = _normalize_text_block(whole_log_text)
+    for line in extracted.splitlines():
+        s = line.strip("\r")
+        if not s:
+            continue
+        if s in whole_log_text:
+            kept.append(s); continue
+        ns = _normalize_line(s)
+        if ns and ns in norm_whole:
+            kept.append(s)
+    return kept
+
+
+def _extractions(kasan_log):
+    lines = kasan_log.splitlines()
+    norm = [_normalize_line(ln) for ln in lines]
+    partial = [ln[: len(ln) // 2] for ln in norm if ln] + ["Read of size 8", "fs/io_uring.c:123"]
+    made_up = ["BUG: KASAN: slab-out-of-bounds in foo", "not in the log", "[ 1.0] Call Trace: x"]
+    return lines, norm, partial, made_up
+
+
+def test_sanitize_matches_reference_below_threshold(kasan_log):
+    lines, norm, partial, made_up = _extractions(kasan_log)
+    extracted = "\n".join(lines + norm + partial + made_up + ["", "\r", "  spaced   out  "])
+    assert len(kasan_log) <= sanitize._SUBSTR_MAX_CHARS
+    assert sanitize_from_log(extracted, kasan_log) == _ref_sanitize(extracted, kasan_log)
+
+
+def test_sanitize_skips_substring_scan_above_threshold(kasan_log, monkeypatch):
+    lines, norm, partial, made_up = _extractions(kasan_log)
+    monkeypatch.setattr(sanitize, "_SUBSTR_MAX_CHARS", len(kasan_log) - 1)
+    # 整行（原样或归一化后）仍然保留；只有部分行不再被接受
+    whole = [ln for ln in lines + norm if ln.strip()]
+    assert sanitize_from_log("\n".join(whole), kasan_log) == whole
+    assert sanitize_from_log("\n".join(partial + made_up), kasan_log) == [
+        p for p in partial if p in lines or p in norm
+    ]
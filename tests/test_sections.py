@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from logagents.core.sections import SECTION_SPECS, _HEX_DUMP, extract_sections_from_log
+
+
+# ---- 改写前的正则实现（逐行逐段 pat.search），作为对照 ----
+def _ref_collect_block_from(lines, start_idx, max_len=120, stop_headers=None):
+    out = []
+    n = len(lines); i = start_idx
+    while i < n and len(out) < max_len:
+        ln = lines[i].rstrip("\n")
+        out.append(ln)
+        if stop_headers:
+            if not _HEX_DUMP.match(ln):
+                nxt = (i+1 < n) and any(hdr.search(lines[i+1]) for hdr in stop_headers)
+                if nxt:
+                    break
+        i += 1
+    return out
+
+def _ref_extract_sections_from_log(lines):
+    found = {}
+    for i, ln in enumerate(lines):
+        for name, pat in SECTION_SPECS:
+            if name in found:
+                continue
+            if pat.search(ln):
+                stop_headers = [p for _, p in SECTION_SPECS if _ != name]
+                if name == "CALL":
+                    block = _ref_collect_block_from(lines, i, max_len=200, stop_headers=stop_headers)
+                elif name in ("MEM", "ALLOC", "FREED", "BUGGY"):
+                    block = _ref_collect_block_from(lines, i, max_len=300, stop_headers=stop_headers)
+                else:
+                    block = _ref_collect_block_from(lines, i, max_len=120, stop_headers=stop_headers)
+                found[name] = block
+    return found
+
+
+def test_extract_sections_matches_regex_reference(log_variants):
+    extra = [
+        ["Read of size 4 BUG: KASAN: x", "Call Trace:", " foo+0x1/0x2", "Allocated by task 1"],
+        ["CPU: 1 PID: 2", "cpu: 3", "Hardware name: QEMU", "Memory state around",
+         "fa fb fb fb fb fb fb fb fb fb", "Freed by task 2:"],
+        ["Call Trace:  ", "BUG: KASAN: ünïcode", "Write of size 8 ä", "The buggy address belongs to"],
+    ]
+    for lines in log_variants + extra:
+        assert extract_sections_from_log(lines) == _ref_extract_sections_from_log(lines), lines